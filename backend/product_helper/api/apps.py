@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AppConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if settings.WARMUP_ON_STARTUP:
+            from product_helper.startup import warmup
+
+            warmup()
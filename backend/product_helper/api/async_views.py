@@ -0,0 +1,73 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+from product_helper.db.pool import close_unusable_connections
+from rest_framework.permissions import SAFE_METHODS
+
+read_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_THREAD_POOL_SIZE,
+    thread_name_prefix='api-read',
+)
+
+
+def _call_in_thread(func, *args, **kwargs):
+    """Вызов функции в потоке пула с обслуживанием соединений с БД."""
+    close_old_connections()
+    if settings.DB_CONN_HEALTH_CHECKS:
+        close_unusable_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """Выполнение синхронной функции в ограниченном пуле потоков."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        read_executor,
+        functools.partial(
+            context.run, _call_in_thread, func, *args, **kwargs)
+    )
+
+
+def _render(view, request, *args, **kwargs):
+    """Вызов вью и рендеринг ответа в том же потоке."""
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def async_read_view(view):
+    """
+    Асинхронная обертка над DRF-вью.
+    Безопасные запросы выполняются параллельно в пуле потоков,
+    изменяющие — в общем потоке Django, как и синхронные вью.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await run_in_pool(_render, view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+    return wrapper
+
+
+def async_read_patterns(patterns, names):
+    """Замена вью маршрутов с указанными именами на асинхронные."""
+    return [
+        URLPattern(
+            pattern.pattern, async_read_view(pattern.callback),
+            pattern.default_args, pattern.name
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,28 @@
+from outbox.consumer import register
+from product_app.models import Recipe
+
+from .fragments import invalidate_fragments
+
+
+@register('recipe-fragments')
+def recipe_fragments(events):
+    """
+    Сброс фрагментов рецептов в общем кэше по событиям изменений:
+    догоняет сбросы, потерянные при падении процесса.
+    """
+    recipe_ids = {event.object_id for event in events
+                  if event.model == 'product_app.recipe'}
+    related = {
+        'product_app.tag': (Recipe.tags.through, 'tag_id'),
+        'product_app.ingredientamount': (
+            Recipe.ingredients.through, 'ingredientamount_id'),
+    }
+    for model, (through, column) in related.items():
+        object_ids = {event.object_id for event in events
+                      if event.model == model}
+        if object_ids:
+            recipe_ids.update(through.objects.filter(**{
+                f'{column}__in': object_ids
+            }).values_list('recipe_id', flat=True))
+    recipe_ids.discard(None)
+    invalidate_fragments(recipe_ids)
@@ -0,0 +1,110 @@
+import os
+from collections import defaultdict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from product_app.models import Recipe, User
+
+FRAGMENT_KEY = 'recipe-fragment:{}'
+# Метка сброшенного фрагмента: пока она в кэше, фрагмент не
+# сохраняется повторно, даже если собран по отстающей реплике.
+INVALIDATED = 'invalidated'
+
+stats = {'hits': 0, 'misses': 0}
+_stats_lock = Lock()
+
+
+def fragment_cache():
+    return caches[settings.RECIPE_FRAGMENT_CACHE]
+
+
+def build_fragments(recipes):
+    """
+    Общая для всех пользователей часть представления рецептов.
+    Связанные данные загружаются пачкой: по запросу на теги,
+    ингредиенты и авторов.
+    """
+    ids = [recipe.id for recipe in recipes]
+    tags = defaultdict(list)
+    for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe_id__in=ids).order_by('tag_id').values_list(
+            'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'):
+        tags[recipe_id].append(dict(zip(('id', 'name', 'color', 'slug'),
+                                        tag)))
+    ingredients = defaultdict(list)
+    for recipe_id, *line in Recipe.ingredients.through.objects.filter(
+            recipe_id__in=ids).order_by('ingredientamount_id').values_list(
+            'recipe_id', 'ingredientamount__ingredient_id',
+            'ingredientamount__ingredient__name',
+            'ingredientamount__ingredient__measurement_unit',
+            'ingredientamount__amount'):
+        ingredients[recipe_id].append(dict(zip(
+            ('id', 'name', 'measurement_unit', 'amount'), line)))
+    authors = {
+        author[1]: dict(zip(
+            ('email', 'id', 'username', 'first_name', 'last_name'), author))
+        for author in User.objects.filter(
+            id__in={recipe.author_id for recipe in recipes}
+        ).values_list('email', 'id', 'username', 'first_name', 'last_name')
+    }
+    return {
+        recipe.id: {
+            'id': recipe.id,
+            'author': authors[recipe.author_id],
+            'ingredients': ingredients[recipe.id],
+            'tags': tags[recipe.id],
+            'name': recipe.name,
+            'image': recipe.image.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+        for recipe in recipes
+    }
+
+
+def get_fragments(recipes):
+    """
+    Фрагменты рецептов: из кэша одним запросом, недостающие — из БД.
+    Собранные фрагменты добавляются только на место пустых ключей,
+    поэтому метку недавнего изменения они не перезаписывают.
+    """
+    cache = fragment_cache()
+    cached = cache.get_many([FRAGMENT_KEY.format(recipe.id)
+                             for recipe in recipes])
+    fragments = {}
+    for recipe in recipes:
+        fragment = cached.get(FRAGMENT_KEY.format(recipe.id))
+        if fragment is not None and fragment != INVALIDATED:
+            fragments[recipe.id] = fragment
+    missing = [recipe for recipe in recipes if recipe.id not in fragments]
+    with _stats_lock:
+        stats['hits'] += len(fragments)
+        stats['misses'] += len(missing)
+    if missing:
+        built = build_fragments(missing)
+        for recipe_id, fragment in built.items():
+            cache.add(FRAGMENT_KEY.format(recipe_id), fragment)
+        fragments.update(built)
+    return fragments
+
+
+def invalidate_fragments(recipe_ids):
+    """
+    Сброс фрагментов измененных рецептов: на FRAGMENT_CACHE_HOLD
+    секунд вместо них кладется метка, чтобы чтение с отстающей реплики
+    или начатое до изменения не вернуло в кэш старые данные.
+    """
+    keys = [FRAGMENT_KEY.format(recipe_id) for recipe_id in recipe_ids]
+    if keys:
+        fragment_cache().set_many(dict.fromkeys(keys, INVALIDATED),
+                                  timeout=settings.FRAGMENT_CACHE_HOLD)
+
+
+def fragment_stats():
+    """Метрики попаданий в кэш фрагментов текущего процесса."""
+    with _stats_lock:
+        current = dict(stats)
+    total = current['hits'] + current['misses']
+    return dict(current, pid=os.getpid(),
+                hit_rate=current['hits'] / total if total else 0.0)
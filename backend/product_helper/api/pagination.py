@@ -0,0 +1,66 @@
+from django.utils.dateparse import parse_datetime
+from product_app import timeline
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class FeedPagination(CursorPagination):
+    """
+    Курсорная пагинация ленты от новых рецептов к старым. Позиция
+    курсора - дата публикации и id крайнего рецепта страницы, страницу
+    собирает timeline.feed_page.
+    """
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def paginate_feed(self, user, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        position = None
+        reverse = False
+        if cursor is not None and cursor.position is not None:
+            position = self.parse_position(cursor.position)
+            reverse = cursor.reverse
+        self.page, has_more = timeline.feed_page(
+            user, self.page_size, position, reverse)
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def parse_position(self, position):
+        pub_date, _, recipe_id = position.rpartition('|')
+        try:
+            pub_date = parse_datetime(pub_date)
+            recipe_id = int(recipe_id)
+        except ValueError:
+            pub_date = None
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, recipe_id
+
+    def position(self, recipe):
+        return f'{recipe.pub_date.isoformat()}|{recipe.id}'
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.position(self.page[0])))
+
+
+class UserCursorPagination(CursorPagination):
+    """Курсорная пагинация пользователей по имени."""
+    ordering = ('username',)
+    page_size_query_param = 'limit'
+    max_page_size = 100
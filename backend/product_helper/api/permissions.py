@@ -10,5 +10,5 @@ class OwnerOrReadOnly(permissions.BasePermission):
         )
 
     def has_object_permission(self, request, view, obj):
-        return (obj.author == request.user
+        return (obj.author_id == request.user.id
                 or request.user.is_superuser)
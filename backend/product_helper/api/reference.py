@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+from product_app import generations
+from product_app.models import Ingredient, Tag
+
+from .renderers import FastJSONRenderer
+from .serializers import IngredientSerializer, TagSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_snapshot = None
+_snapshot_lock = Lock()
+
+
+class Snapshot:
+    """Сериализованный и сжатый справочник тегов и ингредиентов."""
+
+    def __init__(self, generation, data):
+        self.generation = generation
+        self.built = monotonic()
+        self.version = hashlib.sha256(
+            FastJSONRenderer().render(data)).hexdigest()[:16]
+        body = FastJSONRenderer().render(dict(version=self.version, **data))
+        self.bodies = {'gzip': gzip.compress(body, 9), None: body}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body)
+
+    def is_current(self, generation):
+        """Поколение совпадает, и копия не старше GENERATION_TTL."""
+        return (self.generation == generation
+                and monotonic() - self.built <= settings.GENERATION_TTL)
+
+    def encoding(self, accept_encoding):
+        """Лучшее из поддерживаемых клиентом сжатий."""
+        accepted = {
+            part.split(';')[0].strip() for part in accept_encoding.split(',')
+            if not part.replace(' ', '').endswith(('q=0', 'q=0.0'))
+        }
+        return next((encoding for encoding in ('br', 'gzip')
+                     if encoding in accepted and encoding in self.bodies),
+                    None)
+
+
+def build_snapshot(generation):
+    return Snapshot(generation, {
+        'tags': TagSerializer(Tag.objects.all(), many=True).data,
+        'ingredients': IngredientSerializer(
+            Ingredient.objects.all(), many=True).data,
+    })
+
+
+def get_snapshot():
+    """
+    Справочник текущего поколения. Собирается один раз на процесс
+    и заново - после изменения тегов или ингредиентов или по истечении
+    GENERATION_TTL.
+    """
+    global _snapshot
+    generation = generations.current(generations.REFERENCE)
+    snapshot = _snapshot
+    if snapshot is None or not snapshot.is_current(generation):
+        with _snapshot_lock:
+            if _snapshot is None or not _snapshot.is_current(generation):
+                _snapshot = build_snapshot(generation)
+            snapshot = _snapshot
+    return snapshot
+
+
+@require_safe
+def reference_snapshot(request, version=None):
+    """
+    Справочник целиком. Без версии - переадресация на адрес текущей
+    версии, который кэшируется клиентом без срока.
+    """
+    snapshot = get_snapshot()
+    if version != snapshot.version:
+        response = HttpResponseRedirect(reverse(
+            'api:reference-version', args=(snapshot.version,)))
+        response['Cache-Control'] = 'no-cache'
+        return response
+    encoding = snapshot.encoding(request.headers.get('Accept-Encoding', ''))
+    response = HttpResponse(snapshot.bodies[encoding],
+                            content_type='application/json')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Cache-Control'] = IMMUTABLE
+    response['ETag'] = f'"{snapshot.version}-{encoding or "identity"}"'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -1,11 +1,114 @@
+import operator
+
 from django.conf import settings
+from django.db import models, transaction
 from django.shortcuts import get_object_or_404
 from drf_extra_fields.fields import Base64ImageField
-from product_app.models import (Follow, Ingredient, IngredientAmount, Recipe,
-                                Tag, User)
+from product_app import shopping_list
+from product_app import tags as tag_registry
+from product_app.models import (Favorite, Follow, Ingredient, IngredientAmount,
+                                Recipe, ShoppingCart, ShoppingListItem, Tag,
+                                User)
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from .fragments import get_fragments
+
+
+def file_url(field, name, request):
+    """URL файла по имени в хранилище, как у FileField DRF."""
+    if not name:
+        return None
+    url = field.storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    """
+    Быстрая сериализация списков плоских моделей.
+    Строки собираются из .values_list() или атрибутов объектов
+    в порядке Meta.fields, без вызова полей DRF для каждого значения.
+    """
+
+    def get_converters(self):
+        """Преобразователи значений для полей, требующих обработки."""
+        model = self.child.Meta.model
+        request = self.context.get('request')
+        converters = {}
+        for index, name in enumerate(self.child.Meta.fields):
+            field = self.child.fields[name]
+            if isinstance(field, serializers.FileField):
+                model_field = model._meta.get_field(field.source)
+                converters[index] = (
+                    lambda value, model_field=model_field:
+                    file_url(model_field, getattr(value, 'name', value),
+                             request)
+                )
+        return converters
+
+    def to_representation(self, data):
+        fields = self.child.Meta.fields
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        if isinstance(iterable, models.QuerySet):
+            rows = iterable.values_list(*fields)
+        else:
+            rows = map(operator.attrgetter(*fields), iterable)
+        converters = self.get_converters()
+        if not converters:
+            return [dict(zip(fields, row)) for row in rows]
+        representation = []
+        for row in rows:
+            row = list(row)
+            for index, convert in converters.items():
+                row[index] = convert(row[index])
+            representation.append(dict(zip(fields, row)))
+        return representation
+
+
+def represent_recipes(recipes, request):
+    """
+    Представление списка рецептов, совпадающее с RecipeSerializer.
+    Общие данные берутся из кэша фрагментов, к ним добавляются
+    флаги пользователя — по запросу на избранное, корзину и подписки.
+    """
+    fragments = get_fragments(recipes)
+    ids = [recipe.id for recipe in recipes]
+    author_ids = {recipe.author_id for recipe in recipes}
+    user = request.user if request is not None else None
+    favorited = in_cart = subscribed = frozenset()
+    if user is not None and user.is_authenticated:
+        favorited = set(Favorite.recipe.through.objects.filter(
+            favorite__user=user, recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        in_cart = set(ShoppingCart.recipe.through.objects.filter(
+            shoppingcart__user=user, recipe_id__in=ids
+        ).values_list('recipe_id', flat=True))
+        subscribed = set(Follow.objects.filter(
+            user=user, author_id__in=author_ids - {user.id}
+        ).values_list('author_id', flat=True))
+    image_field = Recipe._meta.get_field('image')
+    representation = []
+    for recipe in recipes:
+        fragment = fragments[recipe.id]
+        representation.append({
+            **fragment,
+            'author': dict(fragment['author'],
+                           is_subscribed=recipe.author_id in subscribed),
+            'image': file_url(image_field, fragment['image'], request),
+            'is_favorited': recipe.id in favorited,
+            'is_in_shopping_cart': recipe.id in in_cart,
+            'views': recipe.views,
+        })
+    return representation
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Быстрая сериализация списков рецептов."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        return represent_recipes(list(iterable), self.context.get('request'))
+
 
 class BaseUserSerializer(serializers.ModelSerializer):
     """Сериалазер для модели User."""
@@ -20,16 +123,39 @@ class BaseUserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        """Подписан ли пользователь на автора? (Да или Нет)"""
-        author_user = User.objects.get(pk=obj.id)
+        """
+        Подписан ли пользователь на автора? (Да или Нет)
+        Берется из аннотации запроса, если она есть.
+        """
+        subscribed = getattr(obj, 'is_subscribed', None)
+        if subscribed is not None:
+            return subscribed
         request_user = self.context.get('request').user
         return (Follow.objects.filter(user=request_user,
-                                      author=author_user).exists()
-                if author_user != request_user
+                                      author_id=obj.id).exists()
+                if obj.id != request_user.id
                 and not request_user.is_anonymous
                 else False)
 
 
+class UserListSerializer(BaseUserSerializer):
+    """Пользователь со счетчиками, запрошенными параметром include."""
+    recipes_count = serializers.IntegerField(read_only=True)
+    followers_count = serializers.IntegerField(read_only=True)
+
+    class Meta(BaseUserSerializer.Meta):
+        fields = BaseUserSerializer.Meta.fields + (
+            'recipes_count', 'followers_count')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        include = self.context.get('include', ())
+        for name in ('recipes_count', 'followers_count'):
+            if name not in include:
+                fields.pop(name)
+        return fields
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериалазер для модели User."""
     class Meta:
@@ -71,6 +197,7 @@ class TagSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'name', 'color', 'slug',
         )
+        list_serializer_class = ValuesListSerializer
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -78,6 +205,7 @@ class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit',)
+        list_serializer_class = ValuesListSerializer
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
@@ -110,43 +238,24 @@ class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True)
     ingredients = IngredientAmountSerializer(many=True)
     image = Base64ImageField(required=True)
-    author = serializers.SerializerMethodField('get_author')
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    author = BaseUserSerializer(read_only=True)
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'ingredients', 'tags',
                   'name', 'image', 'text', 'cooking_time',
-                  'is_favorited', 'is_in_shopping_cart')
-
-    def get_is_favorited(self, obj):
-        """Является ли рецепт избранным для пользователя."""
-        user = self.context.get('request').user
-        return (user.favorites.filter(recipe=obj).exists()
-                if not self.context.get('request').user.is_anonymous
-                else False
-                )
+                  'is_favorited', 'is_in_shopping_cart', 'views')
+        list_serializer_class = RecipeListSerializer
 
-    def get_is_in_shopping_cart(self, obj):
-        """Находится ли рецепт в корзине пользователя."""
-        user = self.context.get('request').user
-        return (user.shopping_cart.filter(recipe=obj).exists()
-                if not self.context.get('request').user.is_anonymous
-                else False
-                )
-
-    def get_author(self, obj):
-        """Получение автора рецепта."""
-        instance = get_object_or_404(User, id=obj.author.id)
-        serializer = BaseUserSerializer(
-            instance, context={'request': self.context.get('request')})
-        return serializer.data
+    def to_representation(self, instance):
+        return represent_recipes([instance], self.context.get('request'))[0]
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
     """Сериалазер для создания модели рецептор."""
-    tags = serializers.ListField()
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = serializers.ListField()
     image = Base64ImageField(required=True)
 
@@ -156,8 +265,16 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                   'name', 'image', 'text', 'cooking_time')
 
     def validate(self, data):
-        ingredients_id_list = [ing['id'] for ing in data['ingredients']]
-        for ing in data['ingredients']:
+        """Проверка переданных полей; при PATCH - только присланных."""
+        if 'ingredients' in data:
+            self.check_ingredients(data['ingredients'])
+        if 'tags' in data:
+            self.check_tags(data['tags'])
+        return data
+
+    def check_ingredients(self, ingredients):
+        ingredients_id_list = [ing['id'] for ing in ingredients]
+        for ing in ingredients:
             try:
                 int(ing['amount'])
                 if int(ing['amount']) > 10000:
@@ -170,26 +287,33 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                     {'ingredients':
                      'Количество ингредиентов'
                      f"должно быть числом. {ing['amount']}"})
-        if len(ingredients_id_list) == 0 or len(data['tags']) == 0:
+        if len(ingredients_id_list) == 0:
             raise serializers.ValidationError(
                 {'ingredients/tags':
                  'Ингредиенты/тэги не могут быть пустыми.'})
-        if (len(data['tags']) != len(set(data['tags']))
-                or len(data['ingredients']) != len(set(ingredients_id_list))):
+        if len(ingredients) != len(set(ingredients_id_list)):
             raise serializers.ValidationError(
                 {'ingredients/tags':
                  'Ингредиенты/тэги не могут повтарятся.'})
-        if not Ingredient.objects.filter(
-                id__in=ingredients_id_list).exists():
+        if Ingredient.objects.filter(
+                id__in=ingredients_id_list).count() != len(ingredients):
             raise serializers.ValidationError(
                 {'ingredients':
                  'Ингредиенты переданные при создании рецепта не существуют.'})
-        if not Tag.objects.filter(
-                id__in=data['tags']).exists():
+
+    def check_tags(self, tags):
+        if len(tags) == 0:
+            raise serializers.ValidationError(
+                {'ingredients/tags':
+                 'Ингредиенты/тэги не могут быть пустыми.'})
+        if len(tags) != len(set(tags)):
+            raise serializers.ValidationError(
+                {'ingredients/tags':
+                 'Ингредиенты/тэги не могут повтарятся.'})
+        if tag_registry.missing_ids(tags):
             raise serializers.ValidationError(
                 {'tags':
                  'Тэги переданные при создании рецепта не существуют.'})
-        return data
 
     def to_representation(self, instance):
         """Сериализатор для возвращеия валидных данных."""
@@ -204,58 +328,157 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         """Создание рецепта."""
         ingredients_data = validated_data.pop("ingredients")
         tags_data = validated_data.pop("tags")
-        tags = []
-        for tag in tags_data:
-            tags.append(Tag.objects.get(pk=tag))
-        ingredients = []
-        for ing in ingredients_data:
-            ingredient, _ = IngredientAmount.objects.get_or_create(
-                ingredient=Ingredient.objects.get(pk=ing['id']),
-                amount=ing['amount'])
-            ingredients.append(ingredient)
         recipe = Recipe.objects.create(
             **validated_data,
             author=get_object_or_404(
                 User, username=self.context['request'].user,
             ),
         )
-        recipe.tags.set(tags)
-        recipe.ingredients.set(ingredients)
-        recipe.save()
+        recipe.tags.set(tags_data)
+        recipe.ingredients.set(
+            ingredient_amounts(ingredient_lines(ingredients_data)).values())
         return recipe
 
     def update(self, instance: Recipe, validated_data):
-        """Изменение рецепта."""
-        ingredients_data = validated_data.pop("ingredients")
-        tags_data = validated_data.pop("tags")
-        tags = []
-        for tag in tags_data:
-            tags.append(Tag.objects.get(pk=tag))
-        ingredients = []
-        for ing in ingredients_data:
-            new_ingredient, _ = IngredientAmount.objects.get_or_create(
-                ingredient=Ingredient.objects.get(
-                    pk=ing['id']),
-                amount=ing['amount']
-            )
-            ingredients.append(new_ingredient)
-
-        instance.ingredients.set(ingredients)
-        instance.tags.set(tags)
-        instance.name = validated_data['name']
-        instance.text = validated_data['text']
-        instance.cooking_time = validated_data['cooking_time']
-        if validated_data.get('image'):
-            instance.image = validated_data['image']
-        instance.save()
+        """
+        Изменение рецепта: пишутся только отличающиеся от текущих
+        поля, связи с тегами и ингредиентами меняются по разнице.
+        Любое изменение повышает версию рецепта.
+        """
+        with transaction.atomic():
+            relations_changed = False
+            if 'tags' in validated_data:
+                relations_changed |= self.update_tags(
+                    instance, validated_data.pop('tags'))
+            if 'ingredients' in validated_data:
+                relations_changed |= self.update_ingredients(
+                    instance, validated_data.pop('ingredients'))
+            image = validated_data.pop('image', None)
+            if image is not None and not same_file(instance.image, image):
+                validated_data['image'] = image
+            changed = [
+                name for name, value in validated_data.items()
+                if getattr(instance, name) != value
+            ]
+            for name in changed:
+                setattr(instance, name, validated_data[name])
+            if changed or relations_changed:
+                instance.save(update_fields=changed)
         return instance
 
+    def update_tags(self, instance, tags_data):
+        current = set(instance.tags.values_list('id', flat=True))
+        new = set(tags_data)
+        if current - new:
+            instance.tags.remove(*(current - new))
+        if new - current:
+            instance.tags.add(*(new - current))
+        return current != new
+
+    def update_ingredients(self, instance, ingredients_data):
+        """Замена только добавленных, удаленных и измененных строк."""
+        current = {
+            (ingredient_id, amount): amount_id
+            for amount_id, ingredient_id, amount in
+            instance.ingredients.values_list('id', 'ingredient_id', 'amount')
+        }
+        lines = ingredient_lines(ingredients_data)
+        removed = [amount_id for line, amount_id in current.items()
+                   if line not in lines]
+        added = [line for line in lines if line not in current]
+        if not removed and not added:
+            return False
+        old_lines = shopping_list.recipe_lines([instance.id])
+        if removed:
+            instance.ingredients.remove(*removed)
+        if added:
+            instance.ingredients.add(*ingredient_amounts(added).values())
+        shopping_list.update_recipe_lines(
+            instance.id, old_lines,
+            shopping_list.recipe_lines([instance.id]))
+        return True
+
+
+def ingredient_lines(ingredients_data):
+    """Строки рецепта из запроса: [(ingredient_id, amount)]."""
+    return [(int(ing['id']), int(ing['amount'])) for ing in ingredients_data]
+
+
+def ingredient_amounts(lines):
+    """
+    Записи количества для строк рецепта: существующие находятся одним
+    запросом, недостающие создаются.
+    """
+    if not lines:
+        return {}
+    query = models.Q()
+    for ingredient_id, amount in lines:
+        query |= models.Q(ingredient_id=ingredient_id, amount=amount)
+    found = {
+        (ingredient_id, amount): amount_id
+        for amount_id, ingredient_id, amount in
+        IngredientAmount.objects.filter(query).values_list(
+            'id', 'ingredient_id', 'amount')
+    }
+    return {
+        line: found.get(line) or IngredientAmount.objects.create(
+            ingredient_id=line[0], amount=line[1]).id
+        for line in lines
+    }
+
+
+def same_file(current, new):
+    """Совпадает ли загруженный файл с сохраненным: по размеру и байтам."""
+    if not current:
+        return False
+    try:
+        if current.size != new.size:
+            return False
+        current.open('rb')
+        try:
+            return current.read() == new.read()
+        finally:
+            current.close()
+            new.seek(0)
+    except (OSError, ValueError):
+        return False
+
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Сериалазер для избранных рецептов."""
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time',)
+        list_serializer_class = ValuesListSerializer
+
+
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """Сериализатор позиции списка покупок."""
+    id = serializers.IntegerField(source='ingredient.id')
+    name = serializers.CharField(source='ingredient.name')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
+class BatchSerializer(serializers.Serializer):
+    """Сериалазер для пакетного добавления и удаления по id."""
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=settings.BATCH_MAX_SIZE, required=False, default=list)
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=settings.BATCH_MAX_SIZE, required=False, default=list)
+
+    def validate(self, data):
+        """Повторы id отбрасываются с сохранением порядка."""
+        data['add'] = list(dict.fromkeys(data['add']))
+        data['remove'] = list(dict.fromkeys(data['remove']))
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError(
+                {'add/remove': 'Один id не может быть в обоих списках.'})
+        return data
 
 
 class FollowSerializer(BaseUserSerializer):
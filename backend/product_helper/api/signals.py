@@ -0,0 +1,125 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from jobs.queue import enqueue
+from product_app import generations, recommendations, shopping_list
+from product_app.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                                RecipeNeighbour, ShoppingCart, Tag, User)
+
+from .fragments import invalidate_fragments
+
+
+def invalidate_on_commit(recipe_ids):
+    """Сброс фрагментов после фиксации транзакции."""
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: invalidate_fragments(recipe_ids))
+
+
+def mark_similar_stale(recipe_ids):
+    """Пометка рецептов для пересчета похожих."""
+    if Recipe.objects.filter(pk__in=list(recipe_ids)).update(
+            similar_stale=True):
+        enqueue('similarity.refresh', key='similarity.refresh',
+                delay=settings.SIMILAR_RECIPES_REFRESH_DELAY)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        enqueue('timeline.fan_out', key=f'fan-out:{instance.pk}',
+                recipe_id=instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    shopping_list.remove_recipe_everywhere(instance.pk)
+    mark_similar_stale(RecipeNeighbour.objects.filter(
+        neighbour=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        related = next(
+            field.name for field in sender._meta.get_fields()
+            if field.many_to_one and field.name != 'recipe'
+        )
+        recipe_ids = list(sender.objects.filter(
+            **{related: instance.pk}).values_list('recipe_id', flat=True))
+    else:
+        recipe_ids = list(pk_set)
+    invalidate_on_commit(recipe_ids)
+    mark_similar_stale(recipe_ids)
+
+
+@receiver(m2m_changed, sender=Favorite.recipe.through)
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def interactions_changed(sender, instance, action, reverse, model, pk_set,
+                         **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recommendations.mark_stale([instance.user_id])
+    elif action == 'pre_clear':
+        recommendations.mark_stale(model.objects.filter(
+            recipe=instance).values_list('user_id', flat=True))
+    else:
+        recommendations.mark_stale(model.objects.filter(
+            pk__in=pk_set).values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    invalidate_on_commit(Recipe.tags.through.objects.filter(
+        tag_id=instance.pk).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(pre_delete, sender=IngredientAmount)
+def ingredient_amount_changed(sender, instance, **kwargs):
+    invalidate_on_commit(Recipe.ingredients.through.objects.filter(
+        ingredientamount_id=instance.pk).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    invalidate_on_commit(Recipe.ingredients.through.objects.filter(
+        ingredientamount__ingredient_id=instance.pk
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_unit_changed(sender, instance, **kwargs):
+    shopping_list.sync_units([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def reference_changed(sender, **kwargs):
+    transaction.on_commit(lambda: generations.bump(generations.REFERENCE))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    invalidate_on_commit(
+        instance.recipes.values_list('id', flat=True))
@@ -0,0 +1,263 @@
+import json
+import multiprocessing
+import unittest
+import unittest.mock
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import include, path
+from django.utils import timezone
+from product_app import shopping_list, timeline
+from product_app.models import (Follow, Ingredient, IngredientAmount, Recipe,
+                                ShoppingCart, ShoppingListItem, Tag,
+                                TimelineEntry, User)
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import reference
+from .async_views import async_read_patterns, async_read_view
+from .urls import ASYNC_READ_VIEWS, router_v1
+from .views import ShoppingCartCreateDestroyView
+
+# Маршруты с асинхронными вью, как под ASGI с ASYNC_VIEWS=True.
+urlpatterns = [
+    path('api/recipes/download_shopping_cart/',
+         async_read_view(ShoppingCartCreateDestroyView.as_view())),
+    path('api/', include(async_read_patterns(
+        router_v1.urls, ASYNC_READ_VIEWS))),
+]
+
+PROCESSES = 4
+ATTEMPTS = 25
+LIMIT = 30
+
+# Атомарный incr между процессами есть только у memcached.
+ATOMIC_THROTTLE_CACHE = 'memcached' in settings.CACHES[
+    settings.THROTTLE_CACHE]['BACKEND']
+
+
+def throttled_requests(ip):
+    """Запросы одного процесса; возвращает число пропущенных."""
+    import django
+
+    django.setup()
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+
+    from .throttling import AnonCacheRateThrottle
+
+    class Throttle(AnonCacheRateThrottle):
+        rate = f'{LIMIT}/day'
+
+    allowed = 0
+    for _ in range(ATTEMPTS):
+        request = RequestFactory().get('/api/recipes/', REMOTE_ADDR=ip)
+        request.user = AnonymousUser()
+        allowed += Throttle().allow_request(request, None)
+    return allowed
+
+
+class ThrottleTests(SimpleTestCase):
+
+    def ip(self):
+        """Свой адрес на каждый тест, чтобы не делить счетчики."""
+        return '10.{}.{}.{}'.format(*uuid.uuid4().bytes[:3])
+
+    def test_retry_after(self):
+        ip = self.ip()
+        for _ in range(10):
+            self.client.post('/api/auth/token/login/', REMOTE_ADDR=ip)
+        response = self.client.post('/api/auth/token/login/', REMOTE_ADDR=ip)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertLessEqual(int(response['Retry-After']), 60)
+
+    @unittest.skipUnless(ATOMIC_THROTTLE_CACHE,
+                         'нужен memcached: SHARED_CACHE_LOCATION')
+    def test_limit_is_shared_between_processes(self):
+        ip = self.ip()
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(PROCESSES) as pool:
+            allowed = pool.map(throttled_requests, [ip] * PROCESSES)
+        self.assertEqual(sum(allowed), LIMIT)
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='c@x.ru')
+        self.author = User.objects.create(username='chef', email='s@x.ru')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', image='recipes/soup.png',
+            text='Сварить', cooking_time=30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, path, add=(), remove=()):
+        response = self.client.post(
+            path, {'add': list(add), 'remove': list(remove)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [(item['id'], item['status'])
+                for item in response.data['results']]
+
+    def test_repeated_ids_are_reported_once(self):
+        path = '/api/recipes/shopping_cart/batch/'
+        recipe = self.recipe.id
+        self.assertEqual(self.post(path, add=[recipe, recipe]),
+                         [(recipe, 'added')])
+        self.assertEqual(self.post(path, remove=[recipe, recipe]),
+                         [(recipe, 'removed')])
+        self.assertFalse(ShoppingListItem.objects.filter(
+            user=self.user).exists())
+
+        path = '/api/users/subscriptions/batch/'
+        author = self.author.id
+        self.assertEqual(self.post(path, add=[author, author]),
+                         [(author, 'added')])
+        self.assertEqual(self.post(path, remove=[author, author]),
+                         [(author, 'removed')])
+
+
+@override_settings(FEED_FANOUT_LIMIT=1)
+class FeedTests(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create(username='reader', email='r@x.ru')
+        other = User.objects.create(username='other', email='o@x.ru')
+        self.small = User.objects.create(username='small', email='s@x.ru')
+        self.big = User.objects.create(username='big', email='b@x.ru')
+        stranger = User.objects.create(username='stranger', email='x@x.ru')
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.small),
+            Follow(user=self.reader, author=self.big),
+            Follow(user=other, author=self.big),
+        ])
+        now = timezone.now()
+        self.expected = []
+        for minutes, author in enumerate(
+                [self.small, self.big, stranger] * 3 + [self.big]):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {minutes}',
+                image='recipes/r.png', text='Готовить', cooking_time=10)
+            # Одинаковые даты проверяют порядок по id внутри даты.
+            pub_date = now - timedelta(minutes=minutes // 2)
+            Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+            if author != stranger:
+                self.expected.append(recipe.id)
+        self.expected.sort(key=lambda recipe_id: (
+            Recipe.objects.get(pk=recipe_id).pub_date, recipe_id),
+            reverse=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def pages(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([recipe['id'] for recipe in response.data[
+                'results']])
+            url = response.data[link]
+        return pages
+
+    def test_feed_merges_timeline_and_large_authors(self):
+        # Рецепты автора без подписчиков тоже считаются разосланными.
+        self.assertEqual(timeline.fan_out_pending(), 6)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 3)
+
+        forward = self.pages('/api/recipes/feed/?limit=3', 'next')
+        self.assertEqual(sum(forward, []), self.expected)
+        self.assertEqual([len(page) for page in forward], [3, 3, 1])
+
+        last = self.client.get('/api/recipes/feed/?limit=3')
+        for _ in forward[1:]:
+            last = self.client.get(last.data['next'])
+        backward = self.pages(last.data['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+
+class ReferenceTests(TestCase):
+
+    def setUp(self):
+        reference._snapshot = None
+        self.addCleanup(setattr, reference, '_snapshot', None)
+
+    def slugs(self):
+        body = json.loads(reference.get_snapshot().bodies[None])
+        return [tag['slug'] for tag in body['tags']]
+
+    def test_snapshot_expires_without_new_generation(self):
+        self.assertEqual(self.slugs(), [])
+        # bulk_create не шлет сигналов: поколение не меняется, как при
+        # потерянном сигнале другого процесса.
+        Tag.objects.bulk_create([
+            Tag(name='Обед', color='#49B64E', slug='lunch')])
+        self.assertEqual(self.slugs(), [])
+        with override_settings(GENERATION_TTL=0):
+            self.assertEqual(self.slugs(), ['lunch'])
+
+
+class FragmentStatsTests(TestCase):
+
+    def test_stats_are_staff_only(self):
+        user = User.objects.create(username='cook', email='c@x.ru')
+        admin = User.objects.create(
+            username='admin', email='a@x.ru', is_staff=True)
+        Recipe.objects.create(
+            author=user, name='Суп', image='recipes/soup.png',
+            text='Сварить', cooking_time=30)
+        client = APIClient()
+        client.force_authenticate(user)
+        self.assertEqual(client.get('/api/recipes/').status_code, 200)
+        self.assertEqual(
+            client.get('/api/recipes/fragment_stats/').status_code, 403)
+
+        client.force_authenticate(admin)
+        response = client.get('/api/recipes/fragment_stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(
+            response.data['hits'] + response.data['misses'], 0)
+        self.assertIn('hit_rate', response.data)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncReadViewTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username='cook', email='c@x.ru')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        recipe = Recipe.objects.create(
+            author=self.user, name='Каша', image='recipes/r.png',
+            text='Готовить', cooking_time=10)
+        for name, unit, amount in (('молоко', 'мл', 500),
+                                   ('молоко', 'л', 2),
+                                   ('пшено', 'г', 200)):
+            recipe.ingredients.add(IngredientAmount.objects.create(
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit=unit),
+                amount=amount))
+        ShoppingCart.objects.create(user=self.user).recipe.add(recipe)
+        shopping_list.add_recipes(self.user, [recipe.id])
+
+    async def test_recipe_list(self):
+        response = await self.async_client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Каша'])
+
+    @unittest.mock.patch.object(shopping_list, 'BATCH_SIZE', 1)
+    async def test_shopping_list_download_streams(self):
+        response = await self.async_client.get(
+            '/api/recipes/download_shopping_cart/',
+            **{'Authorization': f'Token {self.token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = await sync_to_async(b''.join)(response.streaming_content)
+        self.assertEqual(body.decode().splitlines(), [
+            'молоко (л) — 2.5', 'пшено (г) — 200'])
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import (AnonRateThrottle, ScopedRateThrottle,
+                                       SimpleRateThrottle)
+
+
+class CacheRateThrottle(SimpleRateThrottle):
+    """
+    Ограничение частоты запросов счетчиком фиксированного окна.
+    Счетчик хранится в общем для всех процессов кэше и обновляется
+    одной атомарной операцией incr на запрос.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        key = f'{self.key}:{window}'
+        cache = caches[settings.THROTTLE_CACHE]
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            if cache.add(key, 1, self.duration):
+                count = 1
+            else:
+                count = cache.incr(key)
+        self.window_end = (window + 1) * self.duration
+        return count <= self.num_requests
+
+    def wait(self):
+        return self.window_end - self.now
+
+
+class AnonCacheRateThrottle(CacheRateThrottle, AnonRateThrottle):
+    """Ограничение для анонимных пользователей по IP."""
+
+
+class LoginRateThrottle(AnonCacheRateThrottle):
+    """Ограничение попыток получения токена."""
+    scope = 'login'
+
+
+class ScopedCacheRateThrottle(CacheRateThrottle, ScopedRateThrottle):
+    """
+    Ограничение по области вью. Область берется из throttle_scopes
+    по действию, затем из throttle_scope, иначе read или write
+    в зависимости от метода запроса.
+    """
+
+    def allow_request(self, request, view):
+        self.scope = (
+            getattr(view, 'throttle_scopes', {}).get(
+                getattr(view, 'action', None))
+            or getattr(view, 'throttle_scope', None)
+            or ('read' if request.method in SAFE_METHODS else 'write')
+        )
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomUserView, FavoriteCreateDestroyView,
+from .async_views import async_read_patterns, async_read_view
+from .reference import reference_snapshot
+from .views import (CustomUserView, FavoriteBatchView,
+                    FavoriteCreateDestroyView, FollowBatchView,
                     FollowListViewSet, FollowView, IngredientsListRetrieveView,
-                    RecipesViewSet, ShoppingCartCreateDestroyView,
+                    RecipesViewSet, ShoppingCartBatchView,
+                    ShoppingCartCreateDestroyView, ShoppingListView,
                     TagListRetrieveViewSet, create_token, delete_token)
 
 app_name = 'api'
@@ -36,16 +41,49 @@ router_v1.register(
     basename='ingredients'
 )
 
+ASYNC_READ_VIEWS = (
+    'recipes-list', 'recipes-detail', 'recipes-feed', 'recipes-similar',
+    'recipes-recommended',
+    'tags-list', 'tags-detail',
+    'ingredients-list', 'ingredients-detail',
+)
+
+router_urls = router_v1.urls
+download_shopping_cart = ShoppingCartCreateDestroyView.as_view()
+shopping_list = ShoppingListView.as_view()
+if settings.ASYNC_VIEWS:
+    router_urls = async_read_patterns(router_urls, ASYNC_READ_VIEWS)
+    download_shopping_cart = async_read_view(download_shopping_cart)
+    shopping_list = async_read_view(shopping_list)
 
 urlpatterns = [
     path('api/recipes/download_shopping_cart/',
-         ShoppingCartCreateDestroyView.as_view(),
+         download_shopping_cart,
          name='shopping_cart-txt'),
+    path('api/recipes/shopping_list/',
+         shopping_list,
+         name='shopping_list'),
+    path('api/recipes/favorite/batch/',
+         FavoriteBatchView.as_view(),
+         name='favorite-batch'),
+    path('api/recipes/shopping_cart/batch/',
+         ShoppingCartBatchView.as_view(),
+         name='shopping_cart-batch'),
+    path('api/recipes/shopping_cart/',
+         ShoppingCartBatchView.as_view(http_method_names=['delete']),
+         name='shopping_cart-clear'),
+    path('api/users/subscriptions/batch/',
+         FollowBatchView.as_view(),
+         name='subscriptions-batch'),
+
+    path('api/reference/', reference_snapshot, name='reference'),
+    path('api/reference/<str:version>/', reference_snapshot,
+         name='reference-version'),
 
     path('api/auth/token/logout/', delete_token, name='logout'),
     path('api/auth/token/login/', create_token, name='login'),
 
-    path('api/', include(router_v1.urls)),
+    path('api/', include(router_urls)),
 
     re_path(r'api/recipes/(?P<id>\d+)/favorite',
             FavoriteCreateDestroyView.as_view(),
@@ -2,33 +2,100 @@ from itertools import chain
 
 from django.contrib.auth.hashers import check_password
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags
 from djoser.views import UserViewSet
-from product_app.models import (Favorite, Follow, Ingredient, IngredientAmount,
-                                Recipe, ShoppingCart, Tag, User)
+from outbox.events import emit
+from product_app import counters, deletion, recommendations, shopping_list
+from product_app import tags as tag_registry
+from product_app import timeline
+from product_app.models import (Favorite, Follow, Ingredient, Recipe,
+                                ShoppingCart, ShoppingListItem, Tag, User)
+from product_app.transfer import export_lines
+from product_app.units import humanize
 from rest_framework import mixins, permissions, status, views, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       throttle_classes)
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from . import fragments
+from .pagination import FeedPagination, UserCursorPagination
 from .permissions import OwnerOrReadOnly
-from .serializers import (BaseUserSerializer, CreateRecipeSerializer,
-                          FollowSerializer, IngredientSerializer,
-                          RecipeSerializer, ShortRecipeSerializer,
-                          TagSerializer, TokenSerializer, UserSerializer)
+from .serializers import (BaseUserSerializer, BatchSerializer,
+                          CreateRecipeSerializer, FollowSerializer,
+                          IngredientSerializer, RecipeSerializer,
+                          ShoppingListItemSerializer, ShortRecipeSerializer,
+                          TagSerializer, TokenSerializer, UserListSerializer,
+                          UserSerializer)
+from .throttling import LoginRateThrottle
 
 
 class CustomUserView(UserViewSet):
     """Кастомный вьюсет Djoser."""
+    counters = {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follow, 'author'),
+    }
+
+    def get_includes(self):
+        """Счетчики, запрошенные параметром ?include=."""
+        include = self.request.query_params.get('include', '')
+        return [name for name in include.split(',') if name in self.counters]
+
+    def get_queryset(self):
+        """
+        Пользователи с признаком подписки из подзапроса, поиском
+        по началу имени или email и счетчиками по запросу.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))))
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.filter(
+                Q(username__istartswith=search)
+                | Q(email__istartswith=search))
+        for name in self.get_includes():
+            model, field = self.counters[name]
+            queryset = queryset.annotate(**{name: Coalesce(Subquery(
+                model.objects.filter(**{field: OuterRef('pk')}).order_by(
+                ).values(field).annotate(total=Count('pk')).values('total')
+            ), 0)})
+        return queryset
+
+    def perform_destroy(self, instance):
+        """Пользователь отключается сразу, данные удаляются в фоне."""
+        deletion.schedule_user_deletion(instance)
+
+    def get_serializer_context(self):
+        return dict(super().get_serializer_context(),
+                    include=self.get_includes())
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация по запросу ?pagination=cursor."""
+        if self.request.query_params.get('pagination') == 'cursor':
+            self.pagination_class = UserCursorPagination
+        return super().paginator
 
     def get_serializer_class(self):
         """Получение сериализаторов для определенных событий."""
         if self.action == 'create':
             return UserSerializer
-        elif self.action in ['list', 'me', 'retrieve']:
+        elif self.action in ['list', 'retrieve']:
+            return UserListSerializer
+        elif self.action == 'me' and self.request.method != 'DELETE':
             return BaseUserSerializer
-        elif self.action == 'set_password':
+        elif self.action in ['set_password', 'destroy', 'me']:
             return super().get_serializer_class()
         return super().get_serializer_class(
             context={
@@ -43,6 +110,7 @@ class CustomUserView(UserViewSet):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([LoginRateThrottle])
 def create_token(request):
     """Создание токена."""
     serializer = TokenSerializer(data=request.data)
@@ -110,6 +178,11 @@ class RecipesViewSet(viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
     page_size_query_param = 'limit'
     permission_classes = [OwnerOrReadOnly]
+    throttle_scopes = {'create': 'recipes_create'}
+    orderings = {
+        'views': ('-views', '-id'),
+        'trending': ('-trending', '-id'),
+    }
 
     def get_queryset(self):
         """Формирование списка рецептов в зависимости от query параметров."""
@@ -136,9 +209,14 @@ class RecipesViewSet(viewsets.ModelViewSet):
         if author:
             recipes = recipes.filter(author__id=int(author))
         if tags_query:
-            recipes = recipes.filter(
-                tags__in=Tag.objects.filter(slug__in=tags_query)).distinct()
-        return recipes or Recipe.objects.none()
+            recipes = recipes.filter(Exists(Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=tag_registry.ids_for_slugs(tags_query))))
+        ordering = self.orderings.get(
+            self.request.query_params.get('ordering'))
+        if ordering:
+            recipes = recipes.order_by(*ordering)
+        return recipes
 
     def get_serializer_class(self):
         """Получение сериализатора для конкретного события."""
@@ -151,49 +229,121 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     def list(self, request):
         """Получение списка рецептов."""
-        serializer = self.get_serializer(self.get_queryset(), many=True)
-        page = self.paginate_queryset(self.get_queryset())
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serialize_page = self.get_serializer(page, many=True)
             return self.get_paginated_response(serialize_page.data)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
         """Получение рецепта по ID."""
         recipe = get_object_or_404(self.get_queryset(), pk=pk)
+        counters.record_view(recipe.id)
         serializer = self.get_serializer(recipe)
-        return Response(serializer.data)
+        return Response(serializer.data, headers={'ETag': recipe.etag})
 
     def create(self, request):
         """Создание рецепта."""
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(serializer.data, status=status.HTTP_201_CREATED,
+                            headers={'ETag': serializer.instance.etag})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def get_object_for_update(self, pk):
+        """
+        Рецепт для изменения: одна выборка с блокировкой строки до
+        конца транзакции и проверка прав на полученном объекте.
+        """
+        recipe = get_object_or_404(Recipe.objects.select_for_update(), pk=pk)
+        self.check_object_permissions(self.request, recipe)
+        return recipe
+
+    def precondition_failed(self, recipe):
+        """Ответ 412, если If-Match не совпадает с версией рецепта."""
+        if_match = self.request.headers.get('If-Match')
+        if if_match is None:
+            return None
+        etags = parse_etags(if_match)
+        if '*' in etags or recipe.etag in etags:
+            return None
+        return Response(
+            {'error': 'Рецепт изменен после получения.'},
+            status=status.HTTP_412_PRECONDITION_FAILED,
+            headers={'ETag': recipe.etag})
+
     def update(self, request, pk, *args, **kwargs):
         """Изменение рецепта."""
-        self.get_object()
         partial = kwargs.pop('partial', False)
-        instance = get_object_or_404(Recipe, pk=pk)
-        serializer = CreateRecipeSerializer(
-            instance, data=request.data, partial=partial, context={
-                'request': self.request})
-        serializer.is_valid(raise_exception=True)
-        self.perform_update(serializer)
-        return Response(serializer.data)
+        with transaction.atomic():
+            instance = self.get_object_for_update(pk)
+            failed = self.precondition_failed(instance)
+            if failed:
+                return failed
+            serializer = CreateRecipeSerializer(
+                instance, data=request.data, partial=partial, context={
+                    'request': self.request})
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        return Response(serializer.data, headers={'ETag': instance.etag})
 
     def partial_update(self, request, *args, **kwargs):
         """Частичное изменение рецепта."""
         kwargs['partial'] = True
         return self.update(request, *args, **kwargs)
 
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Лента рецептов авторов из подписок."""
+        page = self.paginator.paginate_feed(request.user, request)
+        serializer = RecipeSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, permission_classes=[permissions.IsAuthenticated])
+    def recommended(self, request):
+        """Рекомендованные пользователю рецепты."""
+        serializer = RecipeSerializer(
+            recommendations.recommended(request.user), many=True,
+            context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Похожие рецепты."""
+        get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        recipes = Recipe.objects.filter(
+            neighbour_of__recipe_id=pk).order_by('-neighbour_of__score')
+        serializer = RecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
+    @action(detail=False, permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        """Выгрузка всех рецептов в NDJSON потоком."""
+        response = StreamingHttpResponse(
+            export_lines(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
+        return response
+
+    @action(detail=False, permission_classes=[permissions.IsAdminUser])
+    def fragment_stats(self, request):
+        """Попадания в кэш фрагментов рецептов в обработавшем процессе."""
+        return Response(fragments.fragment_stats())
+
     def destroy(self, request, pk):
         """Удаление рецепта."""
-        self.get_object()
-        instanse = get_object_or_404(Recipe, pk=pk)
-        self.perform_destroy(instance=instanse)
+        with transaction.atomic():
+            instance = self.get_object_for_update(pk)
+            failed = self.precondition_failed(instance)
+            if failed:
+                return failed
+            deletion.delete_recipes([instance.pk])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -239,25 +389,13 @@ class ShoppingCartCreateDestroyView(views.APIView):
 
     def get(self, request):
         """Создание и отправка списка покупок."""
-        user = self.request.user
-        shopping_cart = ShoppingCart.objects.filter(user=user)[0]
-        recipes = Recipe.objects.filter(shopping_cart__id=shopping_cart.id)
-        shopping_cart = {}
-        ingredients = IngredientAmount.objects.filter(
-            ingredients__in=recipes
+        lines = (
+            '{} ({}) — {}\n'.format(
+                item.ingredient.name,
+                *reversed(humanize(item.amount, item.measurement_unit)))
+            for item in shopping_list.stream(request.user.id)
         )
-        for ingredient in ingredients:
-            key = (f'{ingredient.ingredient.name} '
-                   f'({ingredient.ingredient.measurement_unit}) —')
-            try:
-                shopping_cart[key] += ingredient.amount
-            except KeyError:
-                shopping_cart[key] = ingredient.amount
-        with open('shopping_cart.txt', "w") as file:
-            for name, amount in shopping_cart.items():
-                file.write(f'{name} {amount}' + '\n')
-        short_report = open('shopping_cart.txt', 'r')
-        return HttpResponse(short_report, content_type='text/plain')
+        return StreamingHttpResponse(lines, content_type='text/plain')
 
     def post(self, request, id=None):
         """Добавление рецепта в корзину."""
@@ -271,8 +409,10 @@ class ShoppingCartCreateDestroyView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         except ObjectDoesNotExist:
-            instace, _ = ShoppingCart.objects.get_or_create(user=user)
-            instace.recipe.add(recipe)
+            with transaction.atomic():
+                instace, _ = ShoppingCart.objects.get_or_create(user=user)
+                instace.recipe.add(recipe)
+                shopping_list.add_recipes(user, [recipe.id])
 
             serializer = ShortRecipeSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -285,7 +425,9 @@ class ShoppingCartCreateDestroyView(views.APIView):
         try:
             shopping_cart_recipe = ShoppingCart.objects.get(
                 user=user, recipe=recipe)
-            shopping_cart_recipe.recipe.remove(recipe)
+            with transaction.atomic():
+                shopping_cart_recipe.recipe.remove(recipe)
+                shopping_list.remove_recipes(user, [recipe.id])
             return Response(status=status.HTTP_204_NO_CONTENT)
         except ObjectDoesNotExist:
             return Response(
@@ -294,6 +436,112 @@ class ShoppingCartCreateDestroyView(views.APIView):
             )
 
 
+class RecipeCollectionBatchView(views.APIView):
+    """
+    Базовое вью для пакетного изменения избранного и корзины.
+    Все изменения выполняются в одной транзакции: одна вставка
+    и одно удаление на пакет.
+    """
+    model = None
+
+    def post(self, request):
+        """Добавление и удаление списка рецептов."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = serializer.validated_data['add']
+        remove = serializer.validated_data['remove']
+        through = self.model.recipe.through
+        owner = self.model._meta.model_name
+        with transaction.atomic():
+            existing = set(Recipe.objects.filter(
+                id__in=add + remove).values_list('id', flat=True))
+            current = set(through.objects.filter(**{
+                f'{owner}__user': request.user,
+                'recipe_id__in': add + remove,
+            }).values_list('recipe_id', flat=True))
+            to_add = [id for id in add
+                      if id in existing and id not in current]
+            to_remove = [id for id in remove if id in current]
+            if to_add:
+                instance = (
+                    self.model.objects.filter(user=request.user).first()
+                    or self.model.objects.create(user=request.user)
+                )
+                through.objects.bulk_create(
+                    [through(**{f'{owner}_id': instance.id, 'recipe_id': id})
+                     for id in to_add],
+                    ignore_conflicts=True
+                )
+                emit(self.model, [instance.id], 'update', field='recipe',
+                     action='add', ids=to_add)
+            if to_remove:
+                rows = through.objects.filter(**{
+                    f'{owner}__user': request.user,
+                    'recipe_id__in': to_remove,
+                })
+                emit(self.model, set(rows.values_list(
+                    f'{owner}_id', flat=True)), 'update', field='recipe',
+                    action='remove', ids=to_remove)
+                rows.delete()
+            self.perform_batch(request.user, to_add, to_remove)
+        results = [
+            {'id': id, 'status': 'not_found' if id not in existing
+             else 'exists' if id in current else 'added'}
+            for id in add
+        ] + [
+            {'id': id, 'status': 'not_found' if id not in existing
+             else 'removed' if id in current else 'missing'}
+            for id in remove
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def perform_batch(self, user, added, removed):
+        """Дополнительные действия после изменения списка."""
+        if added or removed:
+            recommendations.mark_stale([user.id])
+
+
+class FavoriteBatchView(RecipeCollectionBatchView):
+    """Вью для пакетного изменения избранного."""
+    model = Favorite
+
+
+class ShoppingCartBatchView(RecipeCollectionBatchView):
+    """Вью для пакетного изменения корзины."""
+    model = ShoppingCart
+
+    def perform_batch(self, user, added, removed):
+        """Обновление списка покупок."""
+        super().perform_batch(user, added, removed)
+        shopping_list.add_recipes(user, added)
+        shopping_list.remove_recipes(user, removed)
+
+    def delete(self, request):
+        """Очистка корзины одним запросом."""
+        with transaction.atomic():
+            rows = ShoppingCart.recipe.through.objects.filter(
+                shoppingcart__user=request.user)
+            emit(ShoppingCart, set(rows.values_list(
+                'shoppingcart_id', flat=True)), 'update', field='recipe',
+                action='clear', ids=[])
+            rows.delete()
+            ShoppingListItem.objects.filter(user=request.user).delete()
+            recommendations.mark_stale([request.user.id])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ShoppingListView(views.APIView):
+    """Вью для текущего списка покупок."""
+
+    def get(self, request):
+        """Список покупок пользователя."""
+        items = shopping_list.merged_items(ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient'))
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
+
 class FollowListViewSet(viewsets.ModelViewSet):
     """Вьюсет для рецептов подписок."""
     page_size_query_param = 'limit'
@@ -335,7 +583,9 @@ class FollowView(views.APIView):
             return Response({'error': 'Вы уже подписаны'
                              'на автора или вы и есть автор.', },
                             status=status.HTTP_400_BAD_REQUEST)
-        Follow.objects.get_or_create(author=author_follow, user=user)
+        with transaction.atomic():
+            Follow.objects.get_or_create(author=author_follow, user=user)
+            timeline.backfill(user, [author_follow.id])
         serializer = FollowSerializer(author_follow, context={
             'request': self.request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -346,7 +596,52 @@ class FollowView(views.APIView):
         user = request.user
         if Follow.objects.filter(author=author_unfollow, user=user).exists():
             follow = Follow.objects.filter(author=author_unfollow, user=user)
-            follow.delete()
+            with transaction.atomic():
+                follow.delete()
+                timeline.trim(user, [author_unfollow.id])
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'error': 'Такой подписки не существует.', },
                         status=status.HTTP_400_BAD_REQUEST)
+
+
+class FollowBatchView(views.APIView):
+    """Вью для пакетной подписки и отписки."""
+
+    def post(self, request):
+        """Подписка и отписка от списка авторов."""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        add = serializer.validated_data['add']
+        remove = serializer.validated_data['remove']
+        user = request.user
+        with transaction.atomic():
+            existing = set(User.objects.filter(
+                id__in=add + remove).values_list('id', flat=True))
+            current = set(Follow.objects.filter(
+                user=user, author_id__in=add + remove
+            ).values_list('author_id', flat=True))
+            to_add = [id for id in add
+                      if id in existing and id not in current
+                      and id != user.id]
+            to_remove = [id for id in remove if id in current]
+            if to_add:
+                Follow.objects.bulk_create(
+                    [Follow(user=user, author_id=id) for id in to_add],
+                    ignore_conflicts=True
+                )
+                timeline.backfill(user, to_add)
+            if to_remove:
+                Follow.objects.filter(
+                    user=user, author_id__in=to_remove).delete()
+                timeline.trim(user, to_remove)
+        results = [
+            {'id': id, 'status': 'not_found' if id not in existing
+             else 'self' if id == user.id
+             else 'exists' if id in current else 'added'}
+            for id in add
+        ] + [
+            {'id': id, 'status': 'not_found' if id not in existing
+             else 'removed' if id in current else 'missing'}
+            for id in remove
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
@@ -0,0 +1,17 @@
+import multiprocessing
+import os
+
+# Приложение загружается и прогревается один раз в мастер-процессе,
+# воркеры получают готовые модули и кэши через fork.
+os.environ.setdefault('WARMUP_ON_STARTUP', 'True')
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+# ASGI-приложение обслуживают воркеры uvicorn; для WSGI (GUNICORN_APP=
+# product_helper.wsgi:application) задается GUNICORN_WORKER_CLASS=sync.
+worker_class = os.getenv(
+    'GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at',
+                    'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('^name', '=idempotency_key')
+    readonly_fields = ('attempts', 'locked_by', 'started_at', 'finished_at',
+                       'last_error', 'created_at')
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
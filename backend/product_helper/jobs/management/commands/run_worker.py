@@ -0,0 +1,58 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from jobs.worker import Worker
+
+
+def run_process(threads, batch_size, once):
+    worker = Worker(threads=threads, batch_size=batch_size)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run(once=once)
+
+
+class Command(BaseCommand):
+    help = 'Обработка очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='количество процессов'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='количество потоков в каждом процессе'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='сколько задач процесс захватывает за раз'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='обработать готовые задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        worker_args = (
+            options['threads'], options['batch_size'], options['once'])
+        if options['processes'] == 1:
+            run_process(*worker_args)
+        else:
+            connections.close_all()
+            processes = [
+                multiprocessing.Process(target=run_process, args=worker_args)
+                for _ in range(options['processes'])
+            ]
+            for process in processes:
+                process.start()
+
+            def stop(*args):
+                for process in processes:
+                    process.terminate()
+            signal.signal(signal.SIGTERM, stop)
+            signal.signal(signal.SIGINT, stop)
+            for process in processes:
+                process.join()
+        self.stdout.write(self.style.SUCCESS('Обработчик задач остановлен'))
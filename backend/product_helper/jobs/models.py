@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.JSONField('Параметры', default=dict)
+    status = models.CharField(
+        'Статус', max_length=16, choices=STATUSES, default=QUEUED)
+    idempotency_key = models.CharField(
+        'Ключ идемпотентности', max_length=200, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток')
+    run_at = models.DateTimeField('Запуск не раньше', default=timezone.now)
+    locked_by = models.CharField(
+        'Обработчик', max_length=64, blank=True, default='')
+    started_at = models.DateTimeField('Начало', null=True, blank=True)
+    finished_at = models.DateTimeField('Окончание', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True, default='')
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        ordering = ('-id',)
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('idempotency_key',),
+                condition=models.Q(status='queued'),
+                name='unique_queued_job_key')
+        ]
+        indexes = [
+            models.Index(fields=('status', 'run_at'), name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
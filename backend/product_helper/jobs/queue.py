@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+_registry = {}
+
+
+def register(name):
+    """Регистрация функции задачи под именем."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    """Функция задачи по имени; модули tasks приложений грузятся лениво."""
+    if name not in _registry:
+        autodiscover_modules('tasks')
+    return _registry[name]
+
+
+def _create(name, payload, key, delay, max_attempts):
+    Job.objects.bulk_create([Job(
+        name=name,
+        payload=payload,
+        idempotency_key=key,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )], ignore_conflicts=True)
+
+
+def enqueue(name, key=None, delay=0, max_attempts=None, **payload):
+    """
+    Постановка задачи в очередь после фиксации текущей транзакции.
+    Пока задача с тем же ключом ждет в очереди, повторные вызовы
+    ничего не добавляют. В режиме JOBS_EAGER задача выполняется сразу
+    после фиксации в текущем процессе.
+    """
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: get_task(name)(**payload))
+        return
+    transaction.on_commit(
+        lambda: _create(name, payload, key, delay, max_attempts))
@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (DatabaseError, IntegrityError, close_old_connections,
+                       connection, transaction)
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+from .queue import get_task
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка повтора со случайным разбросом."""
+    delay = min(settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOBS_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1)
+
+
+def claim(limit):
+    """
+    Захват готовых к запуску задач одним UPDATE с подзапросом. Строки
+    подзапроса блокируются с SKIP LOCKED, если база это умеет; повтор
+    условия по статусу исключает двойной захват и без блокировок.
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    ready = Q(status=Job.QUEUED, run_at__lte=now) | Q(
+        status=Job.RUNNING, started_at__lt=expired)
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        candidates = Job.objects.filter(ready).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        Job.objects.filter(
+            ready, pk__in=candidates.values('id')[:limit]
+        ).update(
+            status=Job.RUNNING, locked_by=token, started_at=now,
+            attempts=F('attempts') + 1)
+    return list(Job.objects.filter(locked_by=token, status=Job.RUNNING))
+
+
+def _finish(job, **fields):
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        finished_at=timezone.now(), **fields)
+
+
+def execute(job):
+    """Выполнение задачи с повтором при ошибке."""
+    close_old_connections()
+    try:
+        get_task(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Задача %s #%s завершилась ошибкой', job.name, job.pk)
+        if job.attempts >= job.max_attempts:
+            _finish(job, status=Job.FAILED, last_error=error)
+            return
+        run_at = timezone.now() + timedelta(seconds=retry_delay(job.attempts))
+        try:
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status=Job.QUEUED, run_at=run_at, locked_by='',
+                last_error=error)
+        except IntegrityError:
+            _finish(job, status=Job.FAILED,
+                    last_error=error + '\nВ очереди уже есть такая задача.')
+    else:
+        _finish(job, status=Job.DONE, last_error='')
+    finally:
+        close_old_connections()
+
+
+def prune():
+    """Удаление старых выполненных задач."""
+    Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=timezone.now() - timedelta(
+            days=settings.JOBS_KEEP_DONE_DAYS)
+    ).delete()
+
+
+class Worker:
+    """Цикл обработки очереди пулом потоков одного процесса."""
+
+    def __init__(self, threads=1, batch_size=None, poll_interval=None):
+        self.threads = threads
+        self.batch_size = batch_size or settings.JOBS_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.JOBS_POLL_INTERVAL
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run_once(self, executor):
+        try:
+            jobs = claim(min(self.batch_size, self.threads))
+        except DatabaseError:
+            logger.exception('Не удалось получить задачи из очереди')
+            close_old_connections()
+            return 0
+        list(executor.map(execute, jobs))
+        return len(jobs)
+
+    def run(self, once=False):
+        last_prune = None
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while not self.stopping.is_set():
+                processed = self.run_once(executor)
+                if once and not processed:
+                    break
+                if last_prune is None or (
+                        timezone.now() - last_prune).total_seconds() > 3600:
+                    prune()
+                    last_prune = timezone.now()
+                if not processed:
+                    self.stopping.wait(self.poll_interval)
+        close_old_connections()
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import OutboxCheckpoint, OutboxEvent
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model', 'object_id', 'operation', 'created_at')
+    list_filter = ('model', 'operation')
+    search_fields = ('=object_id',)
+    readonly_fields = ('model', 'object_id', 'operation', 'payload',
+                       'created_at')
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+@admin.register(OutboxCheckpoint)
+class OutboxCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('consumer', 'position', 'updated_at')
+    readonly_fields = ('updated_at',)
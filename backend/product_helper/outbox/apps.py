@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class OutboxConfig(AppConfig):
+    name = 'outbox'
+    verbose_name = 'События изменений'
+
+    def ready(self):
+        from .signals import connect_models
+
+        connect_models()
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import OutboxCheckpoint, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    """
+    Регистрация обработчика событий под именем потребителя.
+    Обработчик получает список событий по возрастанию версии; события
+    транзакций, зафиксированных позже следующих, приходят отдельно
+    и с опозданием.
+    """
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    """Обработчик по имени; модули consumers приложений грузятся лениво."""
+    if name not in _registry:
+        autodiscover_modules('consumers')
+    return _registry[name]
+
+
+def pending(checkpoint, limit):
+    """
+    Пропущенные ранее события, которые появились с тех пор, и события
+    после позиции потребителя. Последние OUTBOX_SETTLE_DELAY секунд не
+    читаются, чтобы пропусков от параллельных транзакций было меньше.
+    """
+    late = []
+    gap_ids = [gap_id for gap_id, _ in checkpoint.gaps]
+    if gap_ids:
+        late = list(OutboxEvent.objects.filter(
+            id__in=gap_ids).order_by('id'))
+    settled = timezone.now() - timedelta(seconds=settings.OUTBOX_SETTLE_DELAY)
+    events = list(OutboxEvent.objects.filter(
+        id__gt=checkpoint.position, created_at__lte=settled
+    ).order_by('id')[:limit])
+    return late, events
+
+
+def track_gaps(checkpoint, late, events):
+    """
+    Перенос позиции на последнее событие и учет пропусков: номера
+    между прочитанными событиями принадлежат незафиксированным или
+    откаченным транзакциям. Пропуск ждет события OUTBOX_GAP_TIMEOUT
+    секунд, список ограничен OUTBOX_MAX_GAPS номерами.
+    """
+    now = time.time()
+    found = {event.id for event in late}
+    gaps = []
+    for gap_id, seen_at in checkpoint.gaps:
+        if gap_id in found:
+            continue
+        if now - seen_at > settings.OUTBOX_GAP_TIMEOUT:
+            logger.info('Событие %s потребителя %s не появилось',
+                        gap_id, checkpoint.consumer)
+            continue
+        gaps.append([gap_id, seen_at])
+    # С нулевой позиции (новый или перемотанный потребитель) номера до
+    # первого события уже удалены или не существовали.
+    expected = checkpoint.position + 1 if checkpoint.position else None
+    for event in events:
+        if expected is not None:
+            gaps.extend([gap_id, now] for gap_id in range(expected, event.id))
+        expected = event.id + 1
+    if len(gaps) > settings.OUTBOX_MAX_GAPS:
+        logger.warning('Потребитель %s: пропусков больше %s, старые '
+                       'отброшены', checkpoint.consumer,
+                       settings.OUTBOX_MAX_GAPS)
+        gaps = gaps[-settings.OUTBOX_MAX_GAPS:]
+    changed = gaps != checkpoint.gaps or bool(events)
+    checkpoint.gaps = gaps
+    if events:
+        checkpoint.position = events[-1].id
+    return changed
+
+
+def reset(name, position=0):
+    """Перемотка потребителя для повторной обработки событий."""
+    OutboxCheckpoint.objects.update_or_create(
+        consumer=name, defaults={'position': position, 'gaps': []})
+
+
+def prune():
+    """
+    Удаление событий старше OUTBOX_KEEP_DAYS, которые обработали все
+    потребители. Пока потребителей нет, удаляются все старые события.
+    """
+    expired = OutboxEvent.objects.filter(
+        created_at__lt=timezone.now() - timedelta(
+            days=settings.OUTBOX_KEEP_DAYS))
+    position = OutboxCheckpoint.objects.aggregate(
+        position=Min('position'))['position']
+    if position is not None:
+        expired = expired.filter(id__lte=position)
+    expired.delete()
+
+
+class Consumer:
+    """
+    Чтение событий по порядку с сохранением позиции. Пакет
+    обрабатывается в транзакции вместе с записью позиции: изменения
+    обработчика в базе применяются ровно один раз, внешние (кэш,
+    поисковый индекс) - не меньше одного раза.
+    """
+
+    def __init__(self, name, batch_size=None, poll_interval=None):
+        self.name = name
+        self.handler = get_handler(name)
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def poll(self):
+        """Обработка одного пакета; возвращает число событий."""
+        with transaction.atomic():
+            checkpoint, _ = OutboxCheckpoint.objects.select_for_update(
+            ).get_or_create(consumer=self.name)
+            late, events = pending(checkpoint, self.batch_size)
+            if late or events:
+                self.handler(late + events)
+            if track_gaps(checkpoint, late, events):
+                checkpoint.save(
+                    update_fields=('position', 'gaps', 'updated_at'))
+        return len(late) + len(events)
+
+    def run(self, once=False):
+        last_prune = None
+        while not self.stopping.is_set():
+            try:
+                processed = self.poll()
+            except Exception:
+                logger.exception('Не удалось обработать события %s', self.name)
+                close_old_connections()
+                processed = 0
+            if once and not processed:
+                break
+            if last_prune is None or (
+                    timezone.now() - last_prune).total_seconds() > 3600:
+                prune()
+                last_prune = timezone.now()
+            if not processed:
+                self.stopping.wait(self.poll_interval)
+        close_old_connections()
@@ -0,0 +1,90 @@
+from django.db import models, transaction
+
+INSERT_BATCH_SIZE = 1000
+UPDATE_BATCH_SIZE = 1000
+
+
+def model_label(model):
+    return model._meta.concrete_model._meta.label_lower
+
+
+def tracked_fields(model, fields):
+    """
+    Измененные поля без служебных: None - изменены все поля,
+    пустой список - изменения событий не порождают.
+    """
+    if fields is None:
+        return None
+    return [field for field in fields
+            if field not in model.outbox_ignored_fields]
+
+
+def _write(model, operation, using, rows):
+    from .models import OutboxEvent
+
+    label = model_label(model)
+    OutboxEvent.objects.using(using).bulk_create([
+        OutboxEvent(model=label, object_id=object_id, operation=operation,
+                    payload=payload)
+        for object_id, payload in rows
+    ], batch_size=INSERT_BATCH_SIZE)
+
+
+def emit(model, object_ids, operation, using=None, **payload):
+    """Запись событий об объектах модели в текущей транзакции."""
+    _write(model, operation, using,
+           [(object_id, payload) for object_id in object_ids])
+
+
+def _values(obj):
+    """Поля объекта, у которого после вставки нет id."""
+    return {
+        field.attname: field.value_to_string(obj)
+        for field in obj._meta.concrete_fields
+        if not field.primary_key
+    }
+
+
+class OutboxQuerySet(models.QuerySet):
+    """Массовые операции, которые пишут события в outbox."""
+
+    def update(self, **kwargs):
+        """
+        Изменение пакетами по UPDATE_BATCH_SIZE строк. Строки пакета
+        блокируются до изменения, и изменяются ровно те, о которых
+        пишутся события.
+        """
+        assert not self.query.is_sliced, \
+            'Cannot update a query once a slice has been taken.'
+        fields = tracked_fields(self.model, list(kwargs))
+        if not fields:
+            return super().update(**kwargs)
+        locked = self.select_for_update(of=('self',)).order_by('pk')
+        rows = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            last = None
+            while True:
+                batch = locked if last is None else locked.filter(pk__gt=last)
+                object_ids = list(batch.values_list(
+                    'pk', flat=True)[:UPDATE_BATCH_SIZE])
+                if not object_ids:
+                    break
+                rows += self.model._base_manager.using(self.db).filter(
+                    pk__in=object_ids).update(**kwargs)
+                emit(self.model, object_ids, 'update', using=self.db,
+                     fields=fields)
+                last = object_ids[-1]
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Объекты без id (SQLite, ignore_conflicts) передаются
+        событием без object_id с полями в payload.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            _write(self.model, 'create', self.db, [
+                (obj.pk, {} if obj.pk is not None else _values(obj))
+                for obj in objs
+            ])
+        return objs
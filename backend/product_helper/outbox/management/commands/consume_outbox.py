@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from outbox.consumer import Consumer, reset
+
+
+class Command(BaseCommand):
+    help = 'Обработка событий изменений потребителем'
+
+    def add_arguments(self, parser):
+        parser.add_argument('consumer', help='имя потребителя')
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='сколько событий обрабатывать за раз'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='обработать накопившиеся события и завершиться'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='обработать все сохраненные события заново'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset(options['consumer'])
+        consumer = Consumer(options['consumer'], options['batch_size'])
+        signal.signal(signal.SIGTERM, consumer.stop)
+        signal.signal(signal.SIGINT, consumer.stop)
+        consumer.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Потребитель {consumer.name} остановлен'))
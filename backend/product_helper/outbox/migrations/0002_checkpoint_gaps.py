@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxcheckpoint',
+            name='gaps',
+            field=models.JSONField(default=list, verbose_name='Пропуски'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from .events import OutboxQuerySet, emit, tracked_fields
+
+
+class OutboxEvent(models.Model):
+    """
+    Изменение отслеживаемой модели. Записывается в той же транзакции,
+    что и само изменение; номер события служит версией.
+    """
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    OPERATIONS = (
+        (CREATE, 'Создание'),
+        (UPDATE, 'Изменение'),
+        (DELETE, 'Удаление'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField('Модель', max_length=100)
+    object_id = models.BigIntegerField('Объект', null=True, blank=True)
+    operation = models.CharField(
+        'Операция', max_length=16, choices=OPERATIONS)
+    payload = models.JSONField('Данные', default=dict)
+    created_at = models.DateTimeField('Создано', default=timezone.now)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Событие изменения'
+        verbose_name_plural = 'События изменений'
+        indexes = [
+            models.Index(fields=('created_at',), name='outbox_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} #{self.object_id} {self.operation} v{self.pk}'
+
+    @property
+    def version(self):
+        """Версия изменения: растет с каждым событием объекта."""
+        return self.pk
+
+
+class OutboxCheckpoint(models.Model):
+    """
+    Номер последнего обработанного потребителем события и пропущенные
+    номера ниже него: [номер, время обнаружения] событий транзакций,
+    которые еще не были зафиксированы при чтении.
+    """
+    consumer = models.CharField('Потребитель', max_length=100, unique=True)
+    position = models.BigIntegerField('Позиция', default=0)
+    gaps = models.JSONField('Пропуски', default=list)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        ordering = ('consumer',)
+        verbose_name = 'Позиция потребителя'
+        verbose_name_plural = 'Позиции потребителей'
+
+    def __str__(self):
+        return f'{self.consumer}: {self.position}'
+
+
+class OutboxModel(models.Model):
+    """
+    База для моделей, изменения которых попадают в outbox.
+    Поля из outbox_ignored_fields служебные и событий не порождают.
+    """
+    outbox_ignored_fields = ()
+
+    objects = OutboxQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        operation = (OutboxEvent.CREATE if self._state.adding
+                     else OutboxEvent.UPDATE)
+        fields = tracked_fields(type(self), kwargs.get('update_fields'))
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if fields != []:
+                emit(type(self), [self.pk], operation, using=using,
+                     **({'fields': fields} if fields else {}))
@@ -0,0 +1,65 @@
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+
+from .events import emit
+
+
+def object_deleted(sender, instance, using, **kwargs):
+    emit(sender, [instance.pk], 'delete', using=using)
+
+
+def relations_deleted(sender, instance, using, **kwargs):
+    """
+    Строки связей многие-ко-многим удаляются каскадом без сигналов:
+    владельцы связей получают событие изменения.
+    """
+    for relation in sender._meta.related_objects:
+        if not relation.many_to_many or not is_tracked(relation.related_model):
+            continue
+        field = relation.field
+        owner_ids = list(field.remote_field.through._default_manager.using(
+            using).filter(**{field.m2m_reverse_field_name(): instance.pk})
+            .values_list(field.m2m_column_name(), flat=True))
+        emit(relation.related_model, owner_ids, 'update', using=using,
+             field=field.name, action='remove', ids=[instance.pk])
+
+
+def relation_changed(sender, instance, action, reverse, model, pk_set, using,
+                     **kwargs):
+    """Изменение связей многие-ко-многим - событие владельца связи."""
+    if action not in ('post_add', 'post_remove', 'pre_clear') or (
+            pk_set is not None and not pk_set):
+        return
+    field = next(field for field in (
+        model if reverse else type(instance))._meta.many_to_many
+        if field.remote_field.through is sender)
+    verb = action.split('_')[1]
+    if not reverse:
+        emit(type(instance), [instance.pk], 'update', using=using,
+             field=field.name, action=verb, ids=sorted(pk_set or ()))
+        return
+    if action == 'pre_clear':
+        pk_set = sender._default_manager.using(using).filter(
+            **{field.m2m_reverse_field_name(): instance.pk}
+        ).values_list(field.m2m_column_name(), flat=True)
+    emit(model, sorted(pk_set), 'update', using=using, field=field.name,
+         action='remove' if verb == 'clear' else verb,
+         ids=[instance.pk])
+
+
+def is_tracked(model):
+    from .models import OutboxModel
+
+    return issubclass(model, OutboxModel)
+
+
+def connect_models():
+    """Подключение обработчиков ко всем моделям на базе OutboxModel."""
+    for model in apps.get_models():
+        if not is_tracked(model):
+            continue
+        post_delete.connect(object_deleted, sender=model)
+        pre_delete.connect(relations_deleted, sender=model)
+        for field in model._meta.many_to_many:
+            m2m_changed.connect(relation_changed,
+                                sender=field.remote_field.through)
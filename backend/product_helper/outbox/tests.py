@@ -0,0 +1,115 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from product_app.models import Recipe, User
+
+from . import consumer, events
+from .models import OutboxCheckpoint, OutboxEvent
+
+NAME = 'test-consumer'
+
+
+@override_settings(OUTBOX_SETTLE_DELAY=0, OUTBOX_GAP_TIMEOUT=60)
+class ConsumerGapTests(TestCase):
+
+    def setUp(self):
+        self.received = []
+        consumer.register(NAME)(
+            lambda events: self.received.append(
+                [event.id for event in events]))
+        self.addCleanup(consumer._registry.pop, NAME)
+        self.consumer = consumer.Consumer(NAME)
+
+    def emit(self, *ids):
+        for pk in ids:
+            OutboxEvent.objects.create(
+                id=pk, model='product_app.recipe', object_id=pk,
+                operation=OutboxEvent.UPDATE)
+
+    def gaps(self):
+        return [gap_id for gap_id, _ in OutboxCheckpoint.objects.get(
+            consumer=NAME).gaps]
+
+    def test_late_commit_is_delivered(self):
+        # Событие 2 принадлежит транзакции, которая еще не зафиксирована.
+        self.emit(1, 3)
+        self.assertEqual(self.consumer.poll(), 2)
+        self.assertEqual(self.gaps(), [2])
+
+        self.emit(2, 4)
+        self.assertEqual(self.consumer.poll(), 2)
+        self.assertEqual(self.received, [[1, 3], [2, 4]])
+        self.assertEqual(self.gaps(), [])
+        self.assertEqual(self.consumer.poll(), 0)
+
+    def test_missing_event_is_forgotten_after_timeout(self):
+        self.emit(1, 4)
+        self.consumer.poll()
+        self.assertEqual(self.gaps(), [2, 3])
+
+        OutboxCheckpoint.objects.filter(consumer=NAME).update(
+            gaps=[[2, time.time() - 120], [3, time.time()]])
+        self.assertEqual(self.consumer.poll(), 0)
+        self.assertEqual(self.gaps(), [3])
+
+    @override_settings(OUTBOX_MAX_GAPS=2)
+    def test_gap_list_is_bounded(self):
+        self.emit(1, 5)
+        self.consumer.poll()
+        self.assertEqual(self.gaps(), [3, 4])
+
+    def test_reset_clears_gaps(self):
+        self.emit(1, 3)
+        self.consumer.poll()
+        consumer.reset(NAME)
+        self.assertEqual(self.gaps(), [])
+        self.consumer.poll()
+        self.assertEqual(self.received, [[1, 3], [1, 3]])
+
+
+class PruneTests(TestCase):
+
+    def setUp(self):
+        old = timezone.now() - timedelta(days=30)
+        for pk in (1, 2, 3):
+            OutboxEvent.objects.create(
+                id=pk, model='product_app.recipe', object_id=pk,
+                operation=OutboxEvent.UPDATE, created_at=old)
+        OutboxEvent.objects.create(
+            id=4, model='product_app.recipe', object_id=4,
+            operation=OutboxEvent.UPDATE)
+
+    def ids(self):
+        return list(OutboxEvent.objects.values_list('id', flat=True))
+
+    def test_old_events_are_deleted_without_consumers(self):
+        consumer.prune()
+        self.assertEqual(self.ids(), [4])
+
+    def test_unread_events_are_kept(self):
+        OutboxCheckpoint.objects.create(consumer=NAME, position=2)
+        consumer.prune()
+        self.assertEqual(self.ids(), [3, 4])
+
+
+class BulkUpdateTests(TestCase):
+
+    def setUp(self):
+        author = User.objects.create(username='cook', email='c@x.ru')
+        self.recipes = [Recipe.objects.create(
+            author=author, name=f'Рецепт {index}', image='recipes/r.png',
+            text='Готовить', cooking_time=index) for index in range(5)]
+        OutboxEvent.objects.all().delete()
+
+    @mock.patch.object(events, 'UPDATE_BATCH_SIZE', 2)
+    def test_update_writes_event_per_changed_row(self):
+        rows = Recipe.objects.filter(cooking_time__gte=1).update(
+            cooking_time=60)
+        self.assertEqual(rows, 4)
+        self.assertEqual(
+            sorted(OutboxEvent.objects.values_list('object_id', flat=True)),
+            [recipe.id for recipe in self.recipes[1:]])
+        self.assertEqual(Recipe.objects.filter(cooking_time=60).count(), 4)
@@ -1,34 +1,100 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Count
 
+from . import shopping_list
 from .models import (Favorite, Ingredient, IngredientAmount, Recipe,
                      ShoppingCart, Tag, User)
 
 
-@admin.register(User)
-class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', )
-    search_fields = ('username', 'email')
-    list_filter = ('username', 'email')
+class ScalableAdmin(admin.ModelAdmin):
+    """Настройки списков, не требующие полного обхода таблиц."""
+    show_full_result_count = False
+    list_per_page = 50
     empty_value_display = '-пусто-'
 
 
+class ShoppingListSyncMixin:
+    """
+    Пересчет списков покупок после правок в админке: изменения корзин,
+    рецептов и записей количества идут мимо инкрементального учета.
+    В админке задается cart_lookup - путь от корзины к ее объектам.
+    """
+
+    def shopping_list_users(self, pks):
+        """Пользователи, чьи списки зависят от объектов с этими id."""
+        return ShoppingCart.objects.filter(
+            **{f'{self.cart_lookup}__in': pks}
+        ).values_list('user_id', flat=True)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        shopping_list.rebuild(self.shopping_list_users([form.instance.pk]))
+
+    def delete_model(self, request, obj):
+        user_ids = list(self.shopping_list_users([obj.pk]))
+        super().delete_model(request, obj)
+        shopping_list.rebuild(user_ids)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(self.shopping_list_users(queryset.values('pk')))
+        super().delete_queryset(request, queryset)
+        shopping_list.rebuild(user_ids)
+
+
+@admin.register(User)
+class UserAdmin(ScalableAdmin):
+    list_display = ('username', 'email')
+    search_fields = ('^username', '^email')
+    list_filter = ('is_staff', 'is_active')
+
+
 @admin.register(IngredientAmount)
-class IngredientAmountAdmin(admin.ModelAdmin):
+class IngredientAmountAdmin(ShoppingListSyncMixin, ScalableAdmin):
+    cart_lookup = 'recipe__ingredients'
     list_display = ('ingredient', 'amount',)
-    search_fields = ('amount', )
-    empty_value_display = '-пусто-'
+    ordering = ('-id',)
+    search_fields = ('^ingredient__name', )
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
+
+class RecipeChangeList(ChangeList):
+    """Список рецептов с числом добавлений в избранное для страницы."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        recipes = list(self.result_list)
+        counts = dict(
+            Favorite.recipe.through.objects.filter(
+                recipe_id__in=[recipe.pk for recipe in recipes]
+            ).values('recipe_id').annotate(
+                total=Count('id')
+            ).values_list('recipe_id', 'total').order_by()
+        )
+        for recipe in recipes:
+            recipe.favorites_total = counts.get(recipe.pk, 0)
+        self.result_list = recipes
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ShoppingListSyncMixin, ScalableAdmin):
+    cart_lookup = 'recipe'
     list_display = ('name', 'author', 'favorites_count')
-    search_fields = ('name', 'author__username', 'ingredients')
-    list_filter = ('tags', 'name', 'author')
-    empty_value_display = '-пусто-'
+    list_select_related = ('author',)
+    search_fields = ('^name', '^author__username')
+    list_filter = ('tags',)
+    autocomplete_fields = ('author', 'ingredients')
+    filter_horizontal = ('tags',)
+
+    def get_changelist(self, request, **kwargs):
+        return RecipeChangeList
 
     @admin.display(description='Всего в избранных')
     def favorites_count(self, obj):
-        return obj.favorites.all().count()
+        return obj.favorites_total
 
 
 @admin.register(Tag)
@@ -39,24 +105,25 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ScalableAdmin):
     list_display = ('name', 'measurement_unit',)
-    search_fields = ('name', )
-    list_filter = ('name',)
-    empty_value_display = '-пусто-'
+    search_fields = ('^name', )
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ScalableAdmin):
     fields = ('recipe',)
     list_display = ('user',)
-    search_fields = ('user', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user',)
+    search_fields = ('^user__username', )
+    autocomplete_fields = ('recipe',)
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(ShoppingListSyncMixin, ScalableAdmin):
+    cart_lookup = 'pk'
     fields = ('recipe',)
     list_display = ('user',)
-    search_fields = ('user', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user',)
+    search_fields = ('^user__username', )
+    autocomplete_fields = ('recipe',)
@@ -1,5 +1,22 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.models.signals import post_delete, post_save
 
 
 class ProductAppConfig(AppConfig):
     name = 'product_app'
+
+    def ready(self):
+        from product_helper.db.pool import close_unusable_connections
+
+        from .models import Ingredient, Tag
+        from .tags import clear_tag_registry
+        from .units import clear_canonical_map
+
+        post_save.connect(clear_canonical_map, sender=Ingredient)
+        post_delete.connect(clear_canonical_map, sender=Ingredient)
+        post_save.connect(clear_tag_registry, sender=Tag)
+        post_delete.connect(clear_tag_registry, sender=Tag)
+        if settings.DB_CONN_HEALTH_CHECKS:
+            request_started.connect(close_unusable_connections)
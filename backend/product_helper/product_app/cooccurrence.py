@@ -0,0 +1,136 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Favorite, ShoppingCart, User, UserRecommendation
+
+INSERT_BATCH_SIZE = 1000
+
+
+def interaction_matrix():
+    """
+    Бинарная матрица пользователь x рецепт по избранному и корзинам
+    и идентификаторы ее строк и столбцов.
+    """
+    pairs = [
+        np.array(list(through.objects.values_list(
+            f'{owner}__user_id', 'recipe_id').order_by().iterator()),
+            dtype=np.int64).reshape(-1, 2)
+        for through, owner in (
+            (Favorite.recipe.through, 'favorite'),
+            (ShoppingCart.recipe.through, 'shoppingcart'),
+        )
+    ]
+    pairs = np.concatenate(pairs)
+    user_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    recipe_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (rows, columns)),
+        shape=(len(user_ids), len(recipe_ids)))
+    matrix.data[:] = 1
+    return user_ids, recipe_ids, matrix
+
+
+def item_similarity(matrix):
+    """Косинусная мера совместной встречаемости рецептов."""
+    cooccurrence = (matrix.T @ matrix).tocsr()
+    cooccurrence.setdiag(0)
+    cooccurrence.eliminate_zeros()
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    scale = sparse.diags(
+        (1 / np.sqrt(np.maximum(counts, 1))).astype(np.float32))
+    return (scale @ cooccurrence @ scale).tocsr(), counts
+
+
+def top_items(matrix, similarity, rows, n):
+    """
+    Top-n рецептов для строк пользователей без уже отмеченных ими:
+    номера столбцов и оценки формы (len(rows), n).
+    """
+    interactions = matrix[rows]
+    scores = (interactions @ similarity).toarray()
+    scores[interactions.nonzero()] = 0
+    n = min(n, scores.shape[1])
+    if n <= 0:
+        empty = np.empty((len(rows), 0))
+        return empty.astype(np.int64), empty
+    best = np.argpartition(scores, -n, axis=1)[:, -n:]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return (np.take_along_axis(best, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1))
+
+
+def _save(user_ids, recipe_ids, rows, items, scores):
+    with transaction.atomic():
+        UserRecommendation.objects.filter(
+            user_id__in=user_ids[rows].tolist()).delete()
+        UserRecommendation.objects.bulk_create([
+            UserRecommendation(user_id=int(user_ids[row]),
+                               recipe_id=int(recipe_ids[item]),
+                               score=float(score))
+            for row, row_items, row_scores in zip(rows, items, scores)
+            for item, score in zip(row_items, row_scores)
+            if score > 0
+        ], batch_size=INSERT_BATCH_SIZE)
+
+
+def _save_popular(recipe_ids, counts):
+    n = min(settings.RECOMMENDATIONS_TOP_N, len(counts))
+    best = np.argsort(-counts, kind='stable')[:n]
+    with transaction.atomic():
+        UserRecommendation.objects.filter(user=None).delete()
+        UserRecommendation.objects.bulk_create(
+            UserRecommendation(recipe_id=int(recipe_ids[item]),
+                               score=float(counts[item]))
+            for item in best
+        )
+
+
+def _delete_lists(user_ids):
+    """Удаление списков пользователей, у которых не осталось отметок."""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), INSERT_BATCH_SIZE):
+        UserRecommendation.objects.filter(
+            user_id__in=user_ids[start:start + INSERT_BATCH_SIZE]).delete()
+
+
+def compute(stale_only=False, batch_size=None, progress=None):
+    """
+    Пересчет рекомендаций: для всех пользователей или только для
+    тех, чьи избранное и корзина изменились.
+    """
+    batch_size = batch_size or settings.RECOMMENDATIONS_BATCH_SIZE
+    stale = User.objects.all()
+    if stale_only:
+        stale_ids = list(User.objects.filter(
+            recommendations_stale=True).values_list('id', flat=True))
+        if not stale_ids:
+            return 0
+        stale = stale.filter(pk__in=stale_ids)
+    stale.update(recommendations_stale=False)
+    try:
+        user_ids, recipe_ids, matrix = interaction_matrix()
+        similarity, counts = item_similarity(matrix)
+        if stale_only:
+            candidates = stale_ids
+            rows = np.nonzero(np.isin(user_ids, stale_ids))[0]
+        else:
+            candidates = UserRecommendation.objects.exclude(
+                user=None).values_list(
+                    'user_id', flat=True).order_by().distinct()
+            rows = np.arange(len(user_ids))
+        _delete_lists(set(candidates).difference(user_ids.tolist()))
+        _save_popular(recipe_ids, counts)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            items, scores = top_items(
+                matrix, similarity, batch, settings.RECOMMENDATIONS_TOP_N)
+            _save(user_ids, recipe_ids, batch, items, scores)
+            if progress:
+                progress(min(start + batch_size, len(rows)), len(rows))
+    except Exception:
+        stale.update(recommendations_stale=True)
+        raise
+    return len(rows)
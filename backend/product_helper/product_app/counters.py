@@ -0,0 +1,138 @@
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models import Case, F, Value, When
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+_buffer = Counter()
+_lock = threading.Lock()
+_flusher_pid = None
+
+
+def record_view(recipe_id):
+    """
+    Учет просмотра рецепта в памяти процесса. Накопленные счетчики
+    записываются в БД фоновым потоком раз в VIEWS_FLUSH_INTERVAL
+    секунд: при падении процесса теряются только просмотры за этот
+    интервал.
+    """
+    with _lock:
+        _buffer[recipe_id] += 1
+    if settings.VIEWS_FLUSH_INTERVAL <= 0:
+        flush()
+    elif _flusher_pid != os.getpid():
+        _start_flusher()
+
+
+def _start_flusher():
+    """Поток записи; после fork запускается заново в каждом процессе."""
+    global _flusher_pid
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run, name='recipe-views-flusher',
+                     daemon=True).start()
+    atexit.register(flush)
+
+
+def _run():
+    while True:
+        time.sleep(settings.VIEWS_FLUSH_INTERVAL)
+        close_old_connections()
+        flush()
+
+
+def flush():
+    """Запись накопленных просмотров; при ошибке они вернутся в буфер."""
+    global _buffer
+    with _lock:
+        pending, _buffer = _buffer, Counter()
+    if not pending:
+        return 0
+    try:
+        write_views(pending)
+    except Exception:
+        logger.exception('Не удалось записать просмотры рецептов')
+        with _lock:
+            _buffer.update(pending)
+        return 0
+    return sum(pending.values())
+
+
+def trending_score(score, views, now):
+    """
+    Популярность с затуханием: вклад просмотра уменьшается вдвое за
+    TRENDING_HALF_LIFE часов. Хранится логарифм веса относительно
+    начала эпохи, поэтому значения рецептов сравнимы без пересчета
+    всей таблицы со временем.
+    """
+    age = now / (settings.TRENDING_HALF_LIFE * 3600)
+    return age + math.log2(views + 2 ** (score - age))
+
+
+def write_views(counts, now=None):
+    """
+    Увеличение счетчиков пачками: на PostgreSQL - одним
+    UPDATE ... FROM (VALUES ...) на пачку, на других БД - CASE.
+    Строки блокируются по порядку id, чтобы параллельные записи
+    процессов не теряли популярность и не взаимоблокировались.
+    """
+    now = time.time() if now is None else now
+    using = router.db_for_write(Recipe)
+    ids = iter(sorted(counts))
+    while True:
+        batch = list(islice(ids, BATCH_SIZE))
+        if not batch:
+            return
+        with transaction.atomic(using=using):
+            rows = [
+                (recipe_id, counts[recipe_id],
+                 trending_score(score, counts[recipe_id], now))
+                for recipe_id, score in Recipe.objects.using(
+                    using).select_for_update().filter(
+                    id__in=batch).order_by('id').values_list('id', 'trending')
+            ]
+            if connections[using].vendor == 'postgresql':
+                _update_from_values(using, rows)
+            else:
+                _update_case(using, rows)
+
+
+def _update_from_values(using, rows):
+    if not rows:
+        return
+    connection = connections[using]
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    values = ', '.join(['(%s, %s, %s::double precision)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} AS recipe SET views = recipe.views + '
+            f'batch.views, trending = batch.trending FROM (VALUES {values}) '
+            'AS batch (id, views, trending) WHERE recipe.id = batch.id',
+            [value for row in rows for value in row])
+
+
+def _update_case(using, rows):
+    if not rows:
+        return
+    Recipe.objects.using(using).filter(
+        id__in=[recipe_id for recipe_id, *_ in rows]).update(
+        views=Case(*(When(id=recipe_id, then=F('views') + Value(views))
+                     for recipe_id, views, _ in rows)),
+        trending=Case(*(When(id=recipe_id, then=Value(trending))
+                        for recipe_id, _, trending in rows)),
+    )
@@ -0,0 +1,237 @@
+import logging
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from jobs.queue import enqueue
+from outbox.events import emit
+
+from . import recommendations, shopping_list
+from .models import (Favorite, Follow, IngredientAmount, Recipe,
+                     RecipeNeighbour, ShoppingCart, ShoppingListItem,
+                     TimelineEntry, User, UserRecommendation)
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def log_progress(stats):
+    logger.info('Удалено: %s', ', '.join(
+        f'{label} {count}' for label, count in sorted(stats.items())))
+
+
+def _raw_delete(queryset):
+    """DELETE по условию запроса без сигналов и сборщика Django."""
+    return queryset._raw_delete(router.db_for_write(queryset.model))
+
+
+def delete_in_chunks(queryset, batch_size=BATCH_SIZE, stats=None,
+                     progress=None):
+    """
+    Удаление строк без сигналов пачками
+    DELETE ... WHERE id IN (SELECT id ... LIMIT batch_size), каждая
+    пачка - в своей транзакции. Строки не загружаются в память,
+    блокировки держатся только на время пачки.
+    """
+    model = queryset.model
+    stats = Counter() if stats is None else stats
+    while True:
+        with transaction.atomic(using=router.db_for_write(model)):
+            deleted = _raw_delete(model._base_manager.filter(
+                pk__in=queryset.order_by().values('pk')[:batch_size]))
+        if not deleted:
+            return stats
+        stats[_label(model)] += deleted
+        if progress:
+            progress(stats)
+
+
+def delete_tracked_in_chunks(queryset, batch_size=BATCH_SIZE, stats=None,
+                             progress=None):
+    """То же для моделей с outbox: id пачки попадают в события удаления."""
+    model = queryset.model
+    stats = Counter() if stats is None else stats
+    while True:
+        with transaction.atomic(using=router.db_for_write(model)):
+            ids = list(queryset.order_by('pk').values_list(
+                'pk', flat=True)[:batch_size])
+            if not ids:
+                return stats
+            emit(model, ids, 'delete')
+            _raw_delete(model._base_manager.filter(pk__in=ids))
+        stats[_label(model)] += len(ids)
+        if progress:
+            progress(stats)
+
+
+def _mark_neighbours_stale(recipe_ids):
+    """Пересчет похожих для рецептов, у которых удаляемые были соседями."""
+    if Recipe.objects.filter(pk__in=RecipeNeighbour.objects.filter(
+            neighbour_id__in=recipe_ids).exclude(
+            recipe_id__in=recipe_ids).values('recipe_id')).update(
+            similar_stale=True):
+        enqueue('similarity.refresh', key='similarity.refresh',
+                delay=settings.SIMILAR_RECIPES_REFRESH_DELAY)
+
+
+def _emit_relations_removed(model, recipe_ids):
+    """События владельцам избранного и корзин, потерявшим рецепты."""
+    removed = defaultdict(set)
+    for owner_id, recipe_id in model.recipe.through.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+            f'{model._meta.model_name}_id', 'recipe_id'):
+        removed[owner_id].add(recipe_id)
+    owners = defaultdict(list)
+    for owner_id, ids in removed.items():
+        owners[frozenset(ids)].append(owner_id)
+    for ids, owner_ids in owners.items():
+        emit(model, sorted(owner_ids), 'update', field='recipe',
+             action='remove', ids=sorted(ids))
+
+
+def _delete_orphan_amounts(amount_ids):
+    """
+    Записи количества, на которые больше не ссылается ни один рецепт.
+    Если параллельная транзакция успела сослаться на запись, запись
+    остается.
+    """
+    through = Recipe.ingredients.through.objects
+    orphans = list(IngredientAmount.objects.filter(
+        pk__in=amount_ids).exclude(pk__in=through.filter(
+            ingredientamount_id__in=amount_ids).values(
+            'ingredientamount_id')).values_list('pk', flat=True))
+    if not orphans:
+        return 0
+    try:
+        with transaction.atomic():
+            emit(IngredientAmount, orphans, 'delete')
+            _raw_delete(IngredientAmount.objects.filter(pk__in=orphans))
+    except IntegrityError:
+        logger.info('Записи количества снова используются: %s', orphans)
+        return 0
+    return len(orphans)
+
+
+def _delete_images(names):
+    """Удаление картинок, которые не использует ни один рецепт."""
+    storage = Recipe._meta.get_field('image').storage
+    used = set(Recipe.objects.filter(image__in=names).values_list(
+        'image', flat=True))
+    for name in set(names) - used:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning('Не удалось удалить файл %s', name,
+                           exc_info=True)
+
+
+def delete_recipes(recipe_ids, batch_size=BATCH_SIZE, stats=None,
+                   progress=None, exclude_user_ids=()):
+    """
+    Удаление рецептов пачками с зависимыми строками без обхода
+    объектов сборщиком Django. Для пачки одним набором запросов
+    обновляются списки покупок и рекомендации, помечаются соседи для
+    пересчета похожих, пишутся события outbox; затем удаляются связи,
+    рецепты и ставшие ненужными записи количества, а после фиксации -
+    файлы картинок. Ленты чистятся отдельными короткими транзакциями.
+    exclude_user_ids - пользователи, чьи списки покупок не обновляются
+    (например, удаляемые вместе с рецептами).
+    """
+    stats = Counter() if stats is None else stats
+    recipe_ids = sorted(set(recipe_ids))
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        delete_in_chunks(TimelineEntry.objects.filter(recipe_id__in=batch),
+                         stats=stats)
+        with transaction.atomic():
+            rows = list(Recipe.objects.select_for_update().filter(
+                pk__in=batch).order_by('pk').values_list('pk', 'image'))
+            batch = [recipe_id for recipe_id, _ in rows]
+            if not batch:
+                continue
+            shopping_list.remove_recipes_everywhere(batch, exclude_user_ids)
+            recommendations.mark_stale({
+                user_id for model in (Favorite, ShoppingCart)
+                for user_id in model.objects.filter(
+                    recipe__in=batch).values_list('user_id', flat=True)
+                if user_id not in exclude_user_ids})
+            _mark_neighbours_stale(batch)
+            _emit_relations_removed(Favorite, batch)
+            _emit_relations_removed(ShoppingCart, batch)
+            amount_ids = list(Recipe.ingredients.through.objects.filter(
+                recipe_id__in=batch).values_list(
+                'ingredientamount_id', flat=True).distinct())
+            for queryset in (
+                    Recipe.tags.through.objects.filter(recipe_id__in=batch),
+                    Recipe.ingredients.through.objects.filter(
+                        recipe_id__in=batch),
+                    Favorite.recipe.through.objects.filter(
+                        recipe_id__in=batch),
+                    ShoppingCart.recipe.through.objects.filter(
+                        recipe_id__in=batch),
+                    RecipeNeighbour.objects.filter(recipe_id__in=batch),
+                    RecipeNeighbour.objects.filter(neighbour_id__in=batch),
+                    UserRecommendation.objects.filter(recipe_id__in=batch)):
+                stats[_label(queryset.model)] += _raw_delete(queryset)
+            emit(Recipe, batch, 'delete')
+            stats[_label(Recipe)] += _raw_delete(
+                Recipe.objects.filter(pk__in=batch))
+            stats[_label(IngredientAmount)] += _delete_orphan_amounts(
+                amount_ids)
+            images = [image for _, image in rows if image]
+            transaction.on_commit(lambda images=images: _delete_images(
+                images))
+        if progress:
+            progress(stats)
+    return stats
+
+
+def delete_user(user_id, batch_size=BATCH_SIZE, progress=None):
+    """
+    Удаление пользователя с рецептами и всеми связанными данными.
+    Пользователь сразу отключается, затем рецепты и большие таблицы
+    удаляются пачками; сам пользователь с оставшимися мелкими связями
+    удаляется штатным сборщиком Django. Прерванное удаление можно
+    запустить повторно.
+    """
+    stats = Counter()
+    User.objects.filter(pk=user_id).update(is_active=False)
+    recipes = Recipe.objects.filter(author_id=user_id).order_by('pk')
+    while True:
+        recipe_ids = list(recipes.values_list('pk', flat=True)[:batch_size])
+        if not recipe_ids:
+            break
+        delete_recipes(recipe_ids, batch_size, stats, progress,
+                       exclude_user_ids=[user_id])
+    for queryset in (
+            TimelineEntry.objects.filter(user_id=user_id),
+            TimelineEntry.objects.filter(author_id=user_id),
+            ShoppingListItem.objects.filter(user_id=user_id),
+            UserRecommendation.objects.filter(user_id=user_id),
+            Favorite.recipe.through.objects.filter(favorite__user_id=user_id),
+            ShoppingCart.recipe.through.objects.filter(
+                shoppingcart__user_id=user_id)):
+        delete_in_chunks(queryset, batch_size, stats, progress)
+    for queryset in (
+            Follow.objects.filter(user_id=user_id),
+            Follow.objects.filter(author_id=user_id),
+            Favorite.objects.filter(user_id=user_id),
+            ShoppingCart.objects.filter(user_id=user_id)):
+        delete_tracked_in_chunks(queryset, batch_size, stats, progress)
+    with transaction.atomic():
+        deleted, _ = User.objects.filter(pk=user_id).delete()
+    stats[_label(User)] += deleted
+    if progress:
+        progress(stats)
+    return stats
+
+
+def schedule_user_deletion(user):
+    """Отключение пользователя и удаление его данных фоновой задачей."""
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    enqueue('deletion.user', key=f'delete-user:{user.pk}', user_id=user.pk)
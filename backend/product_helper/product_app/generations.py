@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+GENERATION_KEY = 'generation:{}'
+REFERENCE = 'reference'
+TAGS = 'tags'
+
+
+def generation_cache():
+    return caches[settings.GENERATION_CACHE]
+
+
+def _initial():
+    """
+    Начальное поколение по времени: после вытеснения ключа из кэша
+    оно не совпадет с поколением, запомненным процессами ранее.
+    """
+    return int(time.time() * 1000)
+
+
+def current(name):
+    """Текущее поколение данных, общее для всех процессов."""
+    cache = generation_cache()
+    key = GENERATION_KEY.format(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump(name):
+    """Новое поколение данных: процессы пересоберут свои копии."""
+    cache = generation_cache()
+    key = GENERATION_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial(), None)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from product_app.cooccurrence import compute
+
+
+class Command(BaseCommand):
+    help = 'Расчет рекомендаций по избранному и корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='пересчитать только пользователей с новыми отметками'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='количество пользователей в одном блоке расчета'
+        )
+
+    def handle(self, *args, **options):
+        total = compute(
+            stale_only=options['stale'],
+            batch_size=options['batch_size'],
+            progress=lambda done, total: self.stdout.write(
+                f'{done}/{total}') if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации пересчитаны: {total}'
+        ))
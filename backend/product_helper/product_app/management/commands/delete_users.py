@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from product_app import deletion
+from product_app.models import User
+
+
+class Command(BaseCommand):
+    help = 'Удаление пользователей с рецептами и связанными данными пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='+', help='имена пользователей')
+        parser.add_argument(
+            '--batch-size', type=int, default=deletion.BATCH_SIZE,
+            help='количество строк, удаляемых одной транзакцией'
+        )
+        parser.add_argument(
+            '--background', action='store_true',
+            help='отключить пользователей и удалить данные фоновой задачей'
+        )
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__in=options['usernames']))
+        missing = set(options['usernames']) - {user.username for user in users}
+        if missing:
+            raise CommandError(
+                f'Пользователи не найдены: {", ".join(sorted(missing))}')
+        for user in users:
+            if options['background']:
+                deletion.schedule_user_deletion(user)
+                self.stdout.write(f'{user.username}: удаление в очереди')
+                continue
+            stats = deletion.delete_user(
+                user.pk, batch_size=options['batch_size'],
+                progress=lambda stats: self.stdout.write(', '.join(
+                    f'{label} {count}' for label, count in
+                    sorted(stats.items()))) if options['verbosity'] > 1
+                else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'{user.username}: удалено рецептов '
+                f'{stats["product_app.recipe"]}'
+            ))
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from product_app.transfer import BATCH_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов с тегами и ингредиентами в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='файл для выгрузки, по умолчанию - стандартный вывод'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=BATCH_SIZE,
+            help='количество рецептов, читаемых из БД за раз'
+        )
+
+    def handle(self, *args, **options):
+        output = (sys.stdout if options['output'] == '-'
+                  else open(options['output'], 'w', encoding='utf-8'))
+        total = 0
+        try:
+            for line in export_lines(chunk_size=options['chunk_size']):
+                output.write(line)
+                total += line.startswith('{"type": "recipe"')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {total}'
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from product_app.timeline import fan_out_pending
+
+
+class Command(BaseCommand):
+    help = 'Рассылка еще не разосланных рецептов в ленты подписчиков'
+
+    def handle(self, *args, **options):
+        total = fan_out_pending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов разослано: {total}'
+        ))
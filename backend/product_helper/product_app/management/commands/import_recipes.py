@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from product_app.transfer import BATCH_SIZE, import_lines
+
+
+class Command(BaseCommand):
+    help = 'Загрузка рецептов из NDJSON, выгруженного export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='файл NDJSON, "-" - стандартный ввод'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='количество рецептов в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        source = (sys.stdin if options['path'] == '-'
+                  else open(options['path'], encoding='utf-8'))
+        try:
+            stats = import_lines(
+                source,
+                batch_size=options['batch_size'],
+                progress=lambda stats: self.stdout.write(
+                    f'{stats["recipes"]}') if options['verbosity'] > 1
+                else None,
+            )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {stats["recipes"]}, тегов: '
+            f'{stats["tags"]}, пропущено без автора: {stats["skipped"]}'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from product_app.shopping_list import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчет списков покупок по содержимому корзин'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, можно указать несколько раз'
+        )
+
+    def handle(self, *args, **options):
+        rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок пересчитаны'
+        ))
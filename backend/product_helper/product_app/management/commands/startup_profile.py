@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+SCRIPT = '''
+import json, os, time
+started = time.perf_counter()
+from product_helper.wsgi import application
+loaded = time.perf_counter() - started
+from product_helper.startup import warmup
+print(json.dumps({'load': loaded, 'warmup': warmup()}))
+'''
+
+
+def parse_importtime(output):
+    """
+    Строки -X importtime: "import time: self [us] | cumulative | name".
+    Возвращает список (модуль, собственное время, общее время, уровень).
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(own), int(cumulative), level))
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Время импорта модулей и прогрева при запуске процесса'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=25,
+            help='количество самых долгих импортов в отчете'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, WARMUP_ON_STARTUP='False')
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT],
+            capture_output=True, env=env, text=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+        timings = json.loads(process.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(process.stderr)
+        top_level = min((level for *_, level in imports), default=0)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Импорты верхнего уровня, мс (всего / собственное):'))
+        slowest = sorted(
+            (item for item in imports if item[3] == top_level),
+            key=lambda item: item[2], reverse=True)[:options['top']]
+        for name, own, cumulative, _ in slowest:
+            self.stdout.write(
+                f'{cumulative / 1000:9.1f} {own / 1000:9.1f}  {name}')
+
+        packages = defaultdict(int)
+        for name, own, *_ in imports:
+            packages[name.split('.')[0]] += own
+        self.stdout.write(self.style.MIGRATE_HEADING('Пакеты, мс:'))
+        for name, own in sorted(packages.items(), key=lambda item: item[1],
+                                reverse=True)[:options['top']]:
+            self.stdout.write(f'{own / 1000:9.1f}  {name}')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Прогрев, мс:'))
+        for name, seconds in timings['warmup'].items():
+            self.stdout.write(f'{seconds * 1000:9.1f}  {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка приложения: {timings["load"] * 1000:.1f} мс, '
+            f'модулей: {len(imports)}'
+        ))
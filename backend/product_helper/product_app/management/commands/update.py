@@ -3,7 +3,49 @@ import os.path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from product_app import generations, shopping_list
 from product_app.models import Ingredient
+from product_app.units import clear_canonical_map, normalize_unit
+
+BATCH_SIZE = 1000
+
+
+def read_catalogue(reader):
+    """Строки файла с нормализованными названиями и единицами."""
+    rows = {}
+    for row in reader:
+        name = ' '.join(row[0].split())
+        rows[(name, normalize_unit(row[1]))] = None
+    return list(rows)
+
+
+def normalize_existing():
+    """Приведение единиц уже загруженных ингредиентов к единому виду."""
+    changed = []
+    for ingredient in Ingredient.objects.only('id', 'measurement_unit'):
+        unit = normalize_unit(ingredient.measurement_unit)
+        if unit != ingredient.measurement_unit:
+            ingredient.measurement_unit = unit
+            changed.append(ingredient)
+    Ingredient.objects.bulk_update(
+        changed, ('measurement_unit',), batch_size=BATCH_SIZE)
+    shopping_list.sync_units([ingredient.id for ingredient in changed])
+
+
+def load(rows):
+    """Добавление отсутствующих ингредиентов пачками."""
+    with transaction.atomic():
+        normalize_existing()
+        existing = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in rows if (name, unit) not in existing),
+            batch_size=BATCH_SIZE
+        )
+    clear_canonical_map()
+    generations.bump(generations.REFERENCE)
 
 
 class Command(BaseCommand):
@@ -18,11 +60,7 @@ class Command(BaseCommand):
             with open(file_path, newline='', encoding='utf-8') as f:
                 reader = csv.reader(f)
                 try:
-                    for row in reader:
-                        Ingredient.objects.update_or_create(
-                            name=row[0],
-                            measurement_unit=row[1]
-                        )
+                    load(read_catalogue(reader))
                     self.stdout.write(self.style.SUCCESS(
                         'Ингредиенты успешно добавлены'
                     ))
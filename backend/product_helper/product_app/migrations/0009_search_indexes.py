@@ -0,0 +1,43 @@
+# Generated by Django 3.2 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+# Индексы под префиксный поиск админки (istartswith -> UPPER(...) LIKE).
+PATTERN_INDEXES = (
+    ('recipe_name_prefix_idx', 'product_app_recipe', 'name'),
+    ('ingredient_name_prefix_idx', 'product_app_ingredient', 'name'),
+    ('user_username_prefix_idx', 'product_app_user', 'username'),
+    ('user_email_prefix_idx', 'product_app_user', 'email'),
+)
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in PATTERN_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'(UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in PATTERN_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0008_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2 on 2026-10-19 07:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0011_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+                'ordering': ('user', '-score'),
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recommendations_stale',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Нужен пересчет рекомендаций'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(recommendations_stale=True), fields=['recommendations_stale'], name='user_recommendations_stale_idx'),
+        ),
+        migrations.AddField(
+            model_name='userrecommendation',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product_app.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='userrecommendation',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='userrecommendation',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recommendation'),
+        ),
+    ]
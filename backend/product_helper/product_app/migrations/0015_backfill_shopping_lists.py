@@ -0,0 +1,48 @@
+from itertools import islice
+
+from django.db import migrations
+from django.db.models import Sum
+
+BATCH_SIZE = 1000
+
+
+def backfill_shopping_lists(apps, schema_editor):
+    """
+    Списки покупок для корзин, собранных до появления ShoppingListItem:
+    суммы ингредиентов рецептов корзины в единицах ингредиентов.
+    """
+    Recipe = apps.get_model('product_app', 'Recipe')
+    ShoppingListItem = apps.get_model('product_app', 'ShoppingListItem')
+    ShoppingListItem.objects.all().delete()
+    totals = Recipe.ingredients.through.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values(
+        'recipe__shopping_cart__user_id',
+        'ingredientamount__ingredient_id',
+        'ingredientamount__ingredient__measurement_unit',
+    ).annotate(total=Sum('ingredientamount__amount'))
+    items = (
+        ShoppingListItem(
+            user_id=row['recipe__shopping_cart__user_id'],
+            ingredient_id=row['ingredientamount__ingredient_id'],
+            measurement_unit=row[
+                'ingredientamount__ingredient__measurement_unit'],
+            amount=row['total'])
+        for row in totals.iterator(chunk_size=BATCH_SIZE)
+    )
+    while True:
+        batch = list(islice(items, BATCH_SIZE))
+        if not batch:
+            break
+        ShoppingListItem.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product_app', '0014_recipe_views'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-19 08:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def enqueue_fan_out(apps, schema_editor):
+    """
+    Рецепты, созданные до появления лент, рассылает фоновая задача
+    timeline.fan_out_pending по одному автору в транзакции, а не
+    миграция в одной большой транзакции.
+    """
+    Recipe = apps.get_model('product_app', 'Recipe')
+    Job = apps.get_model('jobs', 'Job')
+    if Recipe.objects.filter(in_timelines=False).exists():
+        Job.objects.bulk_create([Job(
+            name='timeline.fan_out_pending',
+            idempotency_key='timeline.fan_out_pending',
+            max_attempts=settings.JOBS_MAX_ATTEMPTS,
+        )], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+        ('product_app', '0015_backfill_shopping_lists'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(in_timelines=False), fields=['author', '-pub_date', '-id'], name='recipe_not_in_timelines_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_user_date_idx'),
+        ),
+        migrations.RunPython(enqueue_fan_out, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core import validators
 from django.db import models
+from outbox.models import OutboxModel
 
 from .validators import hex_color_validator, username_validator
 
@@ -35,9 +36,20 @@ class User(AbstractUser):
         max_length=settings.PASSWORD_LENGTH,
         blank=False
     )
+    recommendations_stale = models.BooleanField(
+        'Нужен пересчет рекомендаций',
+        default=False,
+        editable=False
+    )
 
     class Meta:
         ordering = ('username',)
+        indexes = [
+            models.Index(
+                fields=('recommendations_stale',),
+                name='user_recommendations_stale_idx',
+                condition=models.Q(recommendations_stale=True)),
+        ]
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
 
@@ -45,7 +57,7 @@ class User(AbstractUser):
         return self.username
 
 
-class Follow(models.Model):
+class Follow(OutboxModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -74,7 +86,7 @@ class Follow(models.Model):
         return f'{self.user} подписан на {self.author}'
 
 
-class Tag(models.Model):
+class Tag(OutboxModel):
     """Тег для рецепта."""
     name = models.CharField(
         'Название тэга',
@@ -129,7 +141,7 @@ class Ingredient(models.Model):
         return self.name
 
 
-class IngredientAmount(models.Model):
+class IngredientAmount(OutboxModel):
     """Модель количества ингредиента."""
     ingredient = models.ForeignKey(
         Ingredient,
@@ -158,8 +170,11 @@ class IngredientAmount(models.Model):
                 f' - {self.amount}')
 
 
-class Recipe(models.Model):
+class Recipe(OutboxModel):
     """Модель рецепта."""
+    outbox_ignored_fields = ('in_timelines', 'similar_stale', 'views',
+                             'trending')
+
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='recipes',
@@ -209,17 +224,69 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    in_timelines = models.BooleanField(
+        'Разослан в ленты подписчиков',
+        default=False,
+        editable=False
+    )
+    similar_stale = models.BooleanField(
+        'Нужен пересчет похожих рецептов',
+        default=True,
+        editable=False
+    )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False
+    )
+    views = models.PositiveIntegerField(
+        'Просмотры',
+        default=0,
+        editable=False
+    )
+    trending = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('similar_stale',), name='recipe_similar_stale_idx',
+                condition=models.Q(similar_stale=True)),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_not_in_timelines_idx',
+                condition=models.Q(in_timelines=False)),
+            models.Index(fields=('-views', '-id'), name='recipe_views_idx'),
+            models.Index(
+                fields=('-trending', '-id'), name='recipe_trending_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Каждое сохранение существующего рецепта повышает версию."""
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = [*kwargs['update_fields'],
+                                           'version']
+        super().save(*args, **kwargs)
+
+    @property
+    def etag(self):
+        return f'"recipe-{self.pk}-v{self.version}"'
+
 
-class Favorite(models.Model):
+class Favorite(OutboxModel):
     """Избранные рецепты."""
     user = models.ForeignKey(
         User,
@@ -236,7 +303,7 @@ class Favorite(models.Model):
         verbose_name_plural = 'Избранные рецепты'
 
 
-class ShoppingCart(models.Model):
+class ShoppingCart(OutboxModel):
     """Список покупок."""
     user = models.ForeignKey(
         User,
@@ -251,3 +318,143 @@ class ShoppingCart(models.Model):
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя."""
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_list',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    measurement_unit = models.CharField(
+        'Единица измерения',
+        max_length=settings.MEASURMENT_COUNT_LENGTH,
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient', 'measurement_unit'),
+                name='unique_shopping_list_item')
+        ]
+
+    def __str__(self):
+        return (f'{self.ingredient.name} ({self.measurement_unit})'
+                f' - {self.amount}')
+
+
+class TimelineEntry(models.Model):
+    """Рецепт автора в ленте подписчика."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_date_idx'),
+            models.Index(
+                fields=('user', 'author'), name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class RecipeNeighbour(models.Model):
+    """Похожий рецепт с оценкой близости."""
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='neighbours',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    neighbour = models.ForeignKey(
+        Recipe,
+        related_name='neighbour_of',
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Близость')
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'neighbour'),
+                name='unique_recipe_neighbour')
+        ]
+
+    def __str__(self):
+        return f'{self.neighbour} похож на {self.recipe}'
+
+
+class UserRecommendation(models.Model):
+    """
+    Рекомендованный пользователю рецепт. Записи без пользователя -
+    популярные рецепты для пользователей без истории.
+    """
+    user = models.ForeignKey(
+        User,
+        related_name='recommendations',
+        on_delete=models.CASCADE,
+        null=True,
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ('user', '-score')
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_user_recommendation')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} для {self.user}'
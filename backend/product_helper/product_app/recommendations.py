@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from jobs.queue import enqueue
+
+from .models import Favorite, Recipe, ShoppingCart, User, UserRecommendation
+
+CACHE_KEY = 'recommendations:{}'
+
+
+def mark_stale(user_ids):
+    """Пометка пользователей для пересчета рекомендаций."""
+    if User.objects.filter(pk__in=list(user_ids)).update(
+            recommendations_stale=True):
+        enqueue('recommendations.refresh', key='recommendations.refresh',
+                delay=settings.RECOMMENDATIONS_REFRESH_DELAY)
+
+
+def _ranked_ids(user):
+    """Идентификаторы рекомендованных рецептов с кэшированием."""
+    key = CACHE_KEY.format(user.id)
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        rows = UserRecommendation.objects.filter(user=user)
+        if not rows.exists():
+            rows = UserRecommendation.objects.filter(user=None)
+        recipe_ids = list(rows.order_by('-score').values_list(
+            'recipe_id', flat=True)[:settings.RECOMMENDATIONS_TOP_N])
+        cache.set(key, recipe_ids, settings.RECOMMENDATIONS_CACHE_TIMEOUT)
+    return recipe_ids
+
+
+def recommended(user):
+    """
+    Рекомендованные рецепты по убыванию оценки без тех, что уже в
+    избранном или корзине пользователя.
+    """
+    recipe_ids = _ranked_ids(user)
+    seen = Q(pk__in=Favorite.recipe.through.objects.filter(
+        favorite__user=user).values('recipe_id')) | Q(
+        pk__in=ShoppingCart.recipe.through.objects.filter(
+            shoppingcart__user=user).values('recipe_id'))
+    recipes = Recipe.objects.filter(pk__in=recipe_ids).exclude(seen).in_bulk()
+    return [recipes[pk] for pk in recipe_ids if pk in recipes]
@@ -0,0 +1,223 @@
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Greatest, Lower
+
+from .models import Recipe, ShoppingCart, ShoppingListItem
+from .units import canonical
+
+BATCH_SIZE = 1000
+
+
+def recipe_lines(recipe_ids):
+    """
+    Суммарные строки рецептов в единицах ингредиентов:
+    {(ingredient_id, unit): amount}. К базовым единицам строки сводятся
+    только при выводе, поэтому хранимый список не зависит от карты
+    канонических ингредиентов процесса.
+    """
+    lines = Counter()
+    rows = Recipe.ingredients.through.objects.filter(
+        recipe_id__in=recipe_ids).values_list(
+            'ingredientamount__ingredient_id',
+            'ingredientamount__ingredient__measurement_unit',
+            'ingredientamount__amount')
+    for ingredient_id, unit, amount in rows:
+        lines[(ingredient_id, unit)] += amount
+    return lines
+
+
+def apply_deltas(user_ids, deltas):
+    """
+    Применение изменений {(ingredient_id, unit): delta} к спискам
+    покупок пользователей. Корзины пользователей блокируются на время
+    изменения, обнулившиеся позиции удаляются.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    user_ids = sorted(set(user_ids))
+    if not deltas or not user_ids:
+        return
+    keys = Q()
+    for ingredient_id, unit in deltas:
+        keys |= Q(ingredient_id=ingredient_id, measurement_unit=unit)
+    with transaction.atomic():
+        list(ShoppingCart.objects.select_for_update().filter(
+            user_id__in=user_ids).order_by('pk').values_list('pk'))
+        items = ShoppingListItem.objects.filter(keys, user_id__in=user_ids)
+        existing = set(items.values_list(
+            'user_id', 'ingredient_id', 'measurement_unit'))
+        items.update(amount=Greatest(
+            F('amount') + Case(
+                *(When(ingredient_id=ingredient_id, measurement_unit=unit,
+                       then=Value(delta))
+                  for (ingredient_id, unit), delta in deltas.items()),
+                default=Value(0)
+            ),
+            Value(0)
+        ))
+        items.filter(amount=0).delete()
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             measurement_unit=unit, amount=delta)
+            for user_id in user_ids
+            for (ingredient_id, unit), delta in deltas.items()
+            if delta > 0
+            and (user_id, ingredient_id, unit) not in existing
+        ])
+
+
+def add_recipes(user, recipe_ids):
+    """Учет рецептов, добавленных в корзину."""
+    apply_deltas([user.id], recipe_lines(recipe_ids))
+
+
+def remove_recipes(user, recipe_ids):
+    """Учет рецептов, удаленных из корзины."""
+    apply_deltas([user.id], {
+        key: -amount for key, amount in recipe_lines(recipe_ids).items()})
+
+
+def cart_user_ids(recipe_id):
+    """Пользователи, у которых рецепт лежит в корзине."""
+    return ShoppingCart.objects.filter(
+        recipe=recipe_id).values_list('user_id', flat=True)
+
+
+def update_recipe_lines(recipe_id, old_lines, new_lines):
+    """Перенос изменения строк рецепта в списки покупок его корзин."""
+    deltas = Counter(new_lines)
+    deltas.subtract(old_lines)
+    apply_deltas(cart_user_ids(recipe_id), deltas)
+
+
+def remove_recipe_everywhere(recipe_id):
+    """Удаление строк рецепта из всех списков покупок."""
+    update_recipe_lines(recipe_id, recipe_lines([recipe_id]), {})
+
+
+def remove_recipes_everywhere(recipe_ids, exclude_user_ids=()):
+    """
+    Удаление строк пачки рецептов из всех списков покупок: строки
+    считаются одним запросом, пользователи с одинаковым набором
+    рецептов из пачки обновляются вместе.
+    """
+    lines = defaultdict(Counter)
+    for recipe_id, ingredient_id, unit, amount in (
+            Recipe.ingredients.through.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredientamount__ingredient_id',
+                'ingredientamount__ingredient__measurement_unit',
+                'ingredientamount__amount')):
+        lines[recipe_id][(ingredient_id, unit)] += amount
+    carts = defaultdict(set)
+    for user_id, recipe_id in ShoppingCart.recipe.through.objects.filter(
+            recipe_id__in=recipe_ids).exclude(
+            shoppingcart__user_id__in=exclude_user_ids).values_list(
+            'shoppingcart__user_id', 'recipe_id'):
+        carts[user_id].add(recipe_id)
+    groups = defaultdict(list)
+    for user_id, in_cart in carts.items():
+        groups[frozenset(in_cart)].append(user_id)
+    for in_cart, user_ids in groups.items():
+        deltas = Counter()
+        for recipe_id in in_cart:
+            deltas.subtract(lines[recipe_id])
+        apply_deltas(user_ids, deltas)
+
+
+def merged_items(items):
+    """
+    Позиции списка, сведенные к каноническим ингредиентам в базовых
+    единицах, по названию. У позиций должен быть загружен ингредиент.
+    """
+    merged = {}
+    for item in items:
+        canonical_id, base, factor = canonical(
+            item.ingredient_id, item.measurement_unit)
+        line = merged.get((canonical_id, base))
+        if line is None:
+            line = merged[(canonical_id, base)] = ShoppingListItem(
+                user_id=item.user_id, ingredient=item.ingredient,
+                measurement_unit=base, amount=0)
+        if item.ingredient_id == canonical_id:
+            line.ingredient = item.ingredient
+        line.amount += item.amount * factor
+    return sorted(merged.values(), key=lambda line: line.ingredient.name)
+
+
+def stream(user_id, batch_size=None):
+    """
+    Сведенные позиции списка по мере чтения. Позиции читаются пачками
+    по названию ингредиента без учета регистра, и позиции с одним
+    названием сводятся, как только прочитаны все.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    items = ShoppingListItem.objects.filter(
+        user_id=user_id
+    ).select_related('ingredient').annotate(
+        sort_name=Lower('ingredient__name')
+    ).order_by('sort_name', 'pk')
+    run, batch = [], list(items[:batch_size])
+    while batch:
+        for item in batch:
+            if run and item.sort_name != run[-1].sort_name:
+                yield from merged_items(run)
+                run = []
+            run.append(item)
+        if len(batch) < batch_size:
+            break
+        last = batch[-1]
+        batch = list(items.filter(
+            Q(sort_name__gt=last.sort_name)
+            | Q(sort_name=last.sort_name, pk__gt=last.pk)
+        )[:batch_size])
+    yield from merged_items(run)
+
+
+def rebuild(user_ids=None):
+    """Полный пересчет списков покупок по содержимому корзин."""
+    users = Q(user_id__in=user_ids) if user_ids is not None else Q()
+    items = ShoppingListItem.objects.filter(users)
+    carts = ShoppingCart.objects.filter(users)
+    totals = Recipe.ingredients.through.objects.filter(
+        recipe__shopping_cart__in=carts
+    ).values(
+        'recipe__shopping_cart__user_id',
+        'ingredientamount__ingredient_id',
+        'ingredientamount__ingredient__measurement_unit',
+    ).annotate(
+        total=Sum('ingredientamount__amount')
+    )
+    with transaction.atomic():
+        list(carts.select_for_update().order_by('pk').values_list('pk'))
+        items.delete()
+        new_items = (
+            ShoppingListItem(
+                user_id=row['recipe__shopping_cart__user_id'],
+                ingredient_id=row['ingredientamount__ingredient_id'],
+                measurement_unit=row[
+                    'ingredientamount__ingredient__measurement_unit'],
+                amount=row['total'])
+            for row in totals.iterator(chunk_size=BATCH_SIZE)
+        )
+        while True:
+            batch = list(islice(new_items, BATCH_SIZE))
+            if not batch:
+                break
+            ShoppingListItem.objects.bulk_create(batch)
+
+
+def sync_units(ingredient_ids):
+    """
+    Пересчет списков, где ингредиенты записаны в прежней единице
+    измерения: после ее правки строки рецептов не совпадут с ними.
+    """
+    user_ids = list(ShoppingListItem.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).exclude(
+        measurement_unit=F('ingredient__measurement_unit')
+    ).values_list('user_id', flat=True).distinct())
+    if user_ids:
+        rebuild(user_ids)
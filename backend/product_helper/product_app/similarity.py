@@ -0,0 +1,150 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from scipy import sparse
+
+from .models import Recipe, RecipeNeighbour
+from .units import canonical_map
+
+TAG_WEIGHT = 0.5
+INSERT_BATCH_SIZE = 1000
+
+
+def _index(values):
+    """Отображение значений в номера строк или столбцов матрицы."""
+    keys, inverse = np.unique(np.asarray(values, dtype=np.int64),
+                              return_inverse=True)
+    return keys, inverse
+
+
+def recipe_matrix():
+    """
+    Нормированная матрица рецептов: строки - рецепты, столбцы -
+    канонические ингредиенты и теги с весами IDF.
+    """
+    mapping = canonical_map()
+    ingredient_pairs = Recipe.ingredients.through.objects.values_list(
+        'recipe_id', 'ingredientamount__ingredient_id').order_by()
+    recipes, features = [], []
+    for recipe_id, ingredient_id in ingredient_pairs.iterator():
+        recipes.append(recipe_id)
+        features.append(mapping.get(ingredient_id, (ingredient_id,))[0])
+    ingredient_count = len(recipes)
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+            'recipe_id', 'tag_id').order_by().iterator():
+        recipes.append(recipe_id)
+        features.append(-tag_id)
+    recipe_ids, rows = _index(recipes)
+    _, columns = _index(features)
+    weights = np.ones(len(rows), dtype=np.float32)
+    weights[ingredient_count:] = TAG_WEIGHT
+    matrix = sparse.csr_matrix(
+        (weights, (rows, columns)),
+        shape=(len(recipe_ids), columns.max() + 1 if len(columns) else 0))
+    matrix.data[:] = np.minimum(matrix.data, 1)
+    frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + matrix.shape[0]) / (1 + frequency)) + 1
+    matrix = matrix @ sparse.diags(idf.astype(np.float32))
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    return recipe_ids, (sparse.diags(
+        (1 / norms).astype(np.float32)) @ matrix).tocsr()
+
+
+def top_neighbours(matrix, transposed, rows, k):
+    """
+    Top-k соседей для строк матрицы по косинусной близости:
+    массивы номеров строк и оценок формы (len(rows), k).
+    """
+    scores = (matrix[rows] @ transposed).toarray()
+    scores[np.arange(len(rows)), rows] = -1
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        empty = np.empty((len(rows), 0))
+        return empty.astype(np.int64), empty
+    best = np.argpartition(scores, -k, axis=1)[:, -k:]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return (np.take_along_axis(best, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1))
+
+
+def _save(recipe_ids, rows, neighbours, scores):
+    with transaction.atomic():
+        RecipeNeighbour.objects.filter(
+            recipe_id__in=recipe_ids[rows].tolist()).delete()
+        RecipeNeighbour.objects.bulk_create([
+            RecipeNeighbour(recipe_id=int(recipe_ids[row]),
+                            neighbour_id=int(recipe_ids[neighbour]),
+                            score=float(score))
+            for row, row_neighbours, row_scores in zip(
+                rows, neighbours, scores)
+            for neighbour, score in zip(row_neighbours, row_scores)
+            if score > 0
+        ], batch_size=INSERT_BATCH_SIZE)
+
+
+def _affected_rows(matrix, transposed, recipe_ids, stale_rows, batch_size):
+    """
+    Рецепты, в чьих списках соседей могли измениться места: сами
+    измененные, их бывшие соседи и рецепты, для которых измененный
+    рецепт ближе текущего последнего соседа.
+    """
+    stale_ids = recipe_ids[stale_rows].tolist()
+    lists = np.array(
+        RecipeNeighbour.objects.values('recipe_id').annotate(
+            last=Min('score'), total=Count('id')
+        ).values_list('recipe_id', 'last', 'total').order_by(),
+        dtype=np.float64).reshape(-1, 3)
+    lists = lists[np.isin(lists[:, 0], recipe_ids)]
+    full = lists[:, 2] >= settings.SIMILAR_RECIPES_TOP_K
+    threshold = np.zeros(len(recipe_ids), dtype=np.float32)
+    threshold[np.searchsorted(recipe_ids, lists[full, 0])] = lists[full, 1]
+    former = list(RecipeNeighbour.objects.filter(
+        neighbour_id__in=stale_ids).values_list('recipe_id', flat=True))
+    affected = np.isin(recipe_ids, former)
+    affected[stale_rows] = True
+    for start in range(0, len(stale_rows), batch_size):
+        rows = stale_rows[start:start + batch_size]
+        scores = (matrix[rows] @ transposed).toarray()
+        affected |= (scores > threshold).any(axis=0)
+    return np.nonzero(affected)[0]
+
+
+def compute(stale_only=False, batch_size=None, progress=None):
+    """
+    Пересчет похожих рецептов: полный или только для измененных
+    рецептов и тех, чьи списки соседей они затрагивают.
+    """
+    batch_size = batch_size or settings.SIMILAR_RECIPES_BATCH_SIZE
+    stale = Recipe.objects.all()
+    if stale_only:
+        stale_ids = list(Recipe.objects.filter(
+            similar_stale=True).values_list('id', flat=True))
+        if not stale_ids:
+            return 0
+        stale = stale.filter(pk__in=stale_ids)
+    stale.update(similar_stale=False)
+    try:
+        RecipeNeighbour.objects.filter(recipe__in=Recipe.objects.filter(
+            ingredients=None, tags=None)).delete()
+        recipe_ids, matrix = recipe_matrix()
+        transposed = matrix.T.tocsr()
+        if stale_only:
+            stale_rows = np.nonzero(np.isin(recipe_ids, stale_ids))[0]
+            rows = _affected_rows(
+                matrix, transposed, recipe_ids, stale_rows, batch_size)
+        else:
+            rows = np.arange(len(recipe_ids))
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            neighbours, scores = top_neighbours(
+                matrix, transposed, batch, settings.SIMILAR_RECIPES_TOP_K)
+            _save(recipe_ids, batch, neighbours, scores)
+            if progress:
+                progress(min(start + batch_size, len(rows)), len(rows))
+    except Exception:
+        stale.update(similar_stale=True)
+        raise
+    return len(rows)
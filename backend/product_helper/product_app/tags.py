@@ -0,0 +1,61 @@
+from collections import namedtuple
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+
+from . import generations
+from .models import Tag
+
+TagRecord = namedtuple('TagRecord', ('id', 'name', 'color', 'slug'))
+
+_registry = {'generation': None, 'loaded': 0.0, 'by_id': {}, 'by_slug': {}}
+_registry_lock = Lock()
+
+
+def _load(generation):
+    records = [TagRecord(*row) for row in Tag.objects.values_list(
+        'id', 'name', 'color', 'slug')]
+    _registry.update(
+        generation=generation,
+        loaded=monotonic(),
+        by_id={record.id: record for record in records},
+        by_slug={record.slug: record for record in records},
+    )
+
+
+def registry(reload=False):
+    """
+    Теги процесса по id и slug. Загружаются один раз и заново - после
+    изменения тегов в любом процессе или по истечении GENERATION_TTL.
+    """
+    generation = generations.current(generations.TAGS)
+    with _registry_lock:
+        expired = monotonic() - _registry['loaded'] > settings.GENERATION_TTL
+        if reload or expired or _registry['generation'] != generation:
+            _load(generation)
+        return _registry
+
+
+def ids_for_slugs(slugs):
+    """Идентификаторы тегов по slug; неизвестные slug пропускаются."""
+    by_slug = registry()['by_slug']
+    return [by_slug[slug].id for slug in slugs if slug in by_slug]
+
+
+def missing_ids(ids):
+    """
+    Идентификаторы, которых нет среди тегов. Перед отказом реестр
+    перечитывается, чтобы не отклонить только что созданный тег.
+    """
+    missing = [pk for pk in ids if pk not in registry()['by_id']]
+    if missing:
+        by_id = registry(reload=True)['by_id']
+        missing = [pk for pk in missing if pk not in by_id]
+    return missing
+
+
+def clear_tag_registry(**kwargs):
+    """Новое поколение тегов после фиксации изменения."""
+    transaction.on_commit(lambda: generations.bump(generations.TAGS))
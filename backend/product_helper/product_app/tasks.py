@@ -0,0 +1,33 @@
+from jobs.queue import register
+
+from . import cooccurrence, deletion, similarity, timeline
+
+
+@register('timeline.fan_out')
+def fan_out(recipe_id):
+    timeline.fan_out(recipe_id)
+
+
+@register('timeline.fan_out_pending')
+def fan_out_pending():
+    timeline.fan_out_pending()
+
+
+@register('similarity.refresh')
+def refresh_similar():
+    similarity.compute(stale_only=True)
+
+
+@register('recommendations.refresh')
+def refresh_recommendations():
+    cooccurrence.compute(stale_only=True)
+
+
+@register('deletion.user')
+def delete_user(user_id):
+    deletion.delete_user(user_id, progress=deletion.log_progress)
+
+
+@register('deletion.recipes')
+def delete_recipes(recipe_ids):
+    deletion.delete_recipes(recipe_ids, progress=deletion.log_progress)
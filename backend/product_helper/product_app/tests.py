@@ -0,0 +1,198 @@
+from importlib import import_module
+
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import TestCase, override_settings
+from jobs.models import Job
+from rest_framework.test import APIClient
+
+from . import shopping_list, tags
+from .models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                     ShoppingCart, ShoppingListItem, Tag, User)
+from .units import clear_canonical_map
+
+
+def historical_apps(migration):
+    """Модели в состоянии после миграции product_app."""
+    return MigrationLoader(connection).project_state(
+        ('product_app', migration)).apps
+
+
+class AdminChangelistTests(TestCase):
+    """Число запросов списков админки не зависит от числа строк."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@x.ru', password='admin-password')
+        self.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.client.force_login(self.admin)
+        self.created = 0
+
+    def add_recipes(self, count):
+        for _ in range(count):
+            self.created += 1
+            author = User.objects.create(
+                username=f'cook{self.created}',
+                email=f'cook{self.created}@x.ru')
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {self.created}',
+                image='recipes/r.png', text='Готовить', cooking_time=10)
+            recipe.tags.add(self.tag)
+            Favorite.objects.create(user=author).recipe.add(recipe)
+
+    def assert_changelist_queries(self, url, queries):
+        for count in (5, 60):
+            self.add_recipes(count)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_recipe_changelist(self):
+        # Сессия, пользователь, теги фильтра, число строк, страница,
+        # счетчики избранного страницы.
+        self.assert_changelist_queries('/admin/product_app/recipe/', 6)
+
+    def test_recipe_changelist_search(self):
+        self.assert_changelist_queries(
+            '/admin/product_app/recipe/?q=Рецепт', 6)
+
+    def test_user_changelist(self):
+        # Сессия, пользователь, число строк, страница.
+        self.assert_changelist_queries('/admin/product_app/user/', 4)
+
+
+class ShoppingListTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@x.ru', password='admin-password')
+        self.user = User.objects.create(username='cook', email='c@x.ru')
+        self.milk = Ingredient.objects.create(
+            name='молоко', measurement_unit='мл')
+        self.amount = IngredientAmount.objects.create(
+            ingredient=self.milk, amount=200)
+        self.recipes = []
+        for name in ('Каша', 'Блины'):
+            recipe = Recipe.objects.create(
+                author=self.admin, name=name, image='recipes/r.png',
+                text='Готовить', cooking_time=10)
+            recipe.ingredients.add(self.amount)
+            self.recipes.append(recipe)
+        self.cart = ShoppingCart.objects.create(user=self.user)
+        self.client.force_login(self.admin)
+
+    def items(self):
+        return list(ShoppingListItem.objects.filter(
+            user=self.user).values_list(
+            'ingredient_id', 'measurement_unit', 'amount'))
+
+    def test_migration_fills_lists_of_existing_carts(self):
+        self.cart.recipe.through.objects.bulk_create([
+            self.cart.recipe.through(
+                shoppingcart_id=self.cart.id, recipe_id=recipe.id)
+            for recipe in self.recipes])
+        self.assertEqual(self.items(), [])
+        migration = '0015_backfill_shopping_lists'
+        module = import_module(f'product_app.migrations.{migration}')
+        module.backfill_shopping_lists(historical_apps(migration), None)
+        self.assertEqual(self.items(), [(self.milk.id, 'мл', 400)])
+
+    def test_migration_stores_lines_in_ingredient_units(self):
+        kilo = Ingredient.objects.create(name='Молоко', measurement_unit='л')
+        amount = IngredientAmount.objects.create(ingredient=kilo, amount=1)
+        self.recipes[1].ingredients.add(amount)
+        self.cart.recipe.add(*self.recipes)
+        ShoppingListItem.objects.all().delete()
+        ShoppingListItem.objects.create(
+            user=self.user, ingredient=self.milk, measurement_unit='мл',
+            amount=1400)
+        migration = '0017_shopping_list_raw_units'
+        module = import_module(f'product_app.migrations.{migration}')
+        module.rebuild_shopping_lists(historical_apps(migration), None)
+        self.assertEqual(sorted(self.items()), sorted([
+            (self.milk.id, 'мл', 400), (kilo.id, 'л', 1)]))
+
+    def test_lines_are_merged_for_display(self):
+        liter = Ingredient.objects.create(name='Молоко', measurement_unit='л')
+        self.recipes[1].ingredients.add(
+            IngredientAmount.objects.create(ingredient=liter, amount=2))
+        self.cart.recipe.add(*self.recipes)
+        shopping_list.add_recipes(
+            self.user, [recipe.id for recipe in self.recipes])
+        # Карта канонических ингредиентов меняется между добавлением
+        # и удалением рецепта.
+        Ingredient.objects.filter(pk=self.milk.pk).update(name='сливки')
+        clear_canonical_map()
+        self.cart.recipe.remove(self.recipes[1])
+        shopping_list.remove_recipes(self.user, [self.recipes[1].id])
+        self.assertEqual(self.items(), [(self.milk.id, 'мл', 200)])
+
+        Ingredient.objects.filter(pk=self.milk.pk).update(name='молоко')
+        clear_canonical_map()
+        self.cart.recipe.add(self.recipes[1])
+        shopping_list.add_recipes(self.user, [self.recipes[1].id])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/recipes/shopping_list/')
+        self.assertEqual(
+            [(line['id'], line['measurement_unit'], line['amount'])
+             for line in response.json()], [(self.milk.id, 'мл', 2400)])
+
+    def test_unit_edit_rebuilds_list(self):
+        self.cart.recipe.add(self.recipes[0])
+        shopping_list.add_recipes(self.user, [self.recipes[0].id])
+        response = self.client.post(
+            f'/admin/product_app/ingredient/{self.milk.id}/change/',
+            {'name': 'молоко', 'measurement_unit': 'л'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.items(), [(self.milk.id, 'л', 200)])
+
+    def test_admin_cart_edit_updates_list(self):
+        response = self.client.post(
+            f'/admin/product_app/shoppingcart/{self.cart.id}/change/',
+            {'recipe': [recipe.id for recipe in self.recipes]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.items(), [(self.milk.id, 'мл', 400)])
+
+        self.client.post(
+            f'/admin/product_app/shoppingcart/{self.cart.id}/delete/',
+            {'post': 'yes'})
+        self.assertEqual(self.items(), [])
+
+    def test_admin_amount_edit_updates_list(self):
+        self.cart.recipe.add(self.recipes[0])
+        response = self.client.post(
+            f'/admin/product_app/ingredientamount/{self.amount.id}/change/',
+            {'ingredient': self.milk.id, 'amount': 300})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.items(), [(self.milk.id, 'мл', 300)])
+
+
+class TagRegistryTests(TestCase):
+
+    def test_registry_expires_without_new_generation(self):
+        tags.registry(reload=True)
+        # bulk_create не шлет сигналов, как при потерянном сигнале
+        # другого процесса.
+        Tag.objects.bulk_create([
+            Tag(name='Обед', color='#49B64E', slug='lunch')])
+        self.assertEqual(tags.ids_for_slugs(['lunch']), [])
+        with override_settings(GENERATION_TTL=0):
+            self.assertEqual(tags.ids_for_slugs(['lunch']),
+                             [Tag.objects.get(slug='lunch').id])
+
+
+class TimelineBackfillTests(TestCase):
+
+    def test_migration_queues_fan_out_job(self):
+        author = User.objects.create(username='cook', email='c@x.ru')
+        Recipe.objects.create(
+            author=author, name='Каша', image='recipes/r.png',
+            text='Готовить', cooking_time=10)
+        migration = '0016_timeline_backfill'
+        module = import_module(f'product_app.migrations.{migration}')
+        for _ in range(2):
+            module.enqueue_fan_out(historical_apps(migration), None)
+        self.assertEqual(list(Job.objects.values_list('name', 'status')),
+                         [('timeline.fan_out_pending', Job.QUEUED)])
@@ -0,0 +1,150 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Follow, Recipe, TimelineEntry, User
+
+BATCH_SIZE = 1000
+
+
+def _bulk_insert(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _lock_authors(author_ids):
+    """
+    Блокировка авторов: рассылка и изменение подписок на одного автора
+    выполняются по очереди, и подписчик не пропускает рецепт.
+    """
+    list(User.objects.select_for_update().filter(
+        pk__in=author_ids).order_by('pk').values_list('pk'))
+
+
+def fan_out(recipe_id):
+    """
+    Рассылка рецепта в ленты подписчиков автора. Рецепты авторов с
+    числом подписчиков больше FEED_FANOUT_LIMIT не рассылаются и
+    читаются из подписок при запросе ленты.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'id', 'author_id', 'pub_date', 'in_timelines').first()
+    if recipe is None or recipe.in_timelines:
+        return
+    followers = Follow.objects.filter(author_id=recipe.author_id)
+    limit = settings.FEED_FANOUT_LIMIT
+    if followers[:limit + 1].count() > limit:
+        return
+    with transaction.atomic():
+        _lock_authors([recipe.author_id])
+        _bulk_insert(
+            TimelineEntry(user_id=user_id, recipe_id=recipe.id,
+                          author_id=recipe.author_id,
+                          pub_date=recipe.pub_date)
+            for user_id in followers.values_list(
+                'user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+        )
+        Recipe.objects.filter(pk=recipe.id).update(in_timelines=True)
+
+
+def backfill(user, author_ids):
+    """Добавление разосланных рецептов авторов в ленту нового подписчика."""
+    _lock_authors(author_ids)
+    recipes = Recipe.objects.filter(
+        author_id__in=author_ids, in_timelines=True
+    ).values_list('id', 'author_id', 'pub_date').order_by()
+    _bulk_insert(
+        TimelineEntry(user_id=user.id, recipe_id=recipe_id,
+                      author_id=author_id, pub_date=pub_date)
+        for recipe_id, author_id, pub_date in recipes.iterator(
+            chunk_size=BATCH_SIZE)
+    )
+
+
+def trim(user, author_ids):
+    """Удаление рецептов авторов из ленты после отписки."""
+    _lock_authors(author_ids)
+    TimelineEntry.objects.filter(
+        user=user, author_id__in=author_ids).delete()
+
+
+def fan_out_pending():
+    """
+    Рассылка всех еще не разосланных рецептов, например созданных до
+    появления лент, по одному автору в транзакции. Рецепты авторов с
+    числом подписчиков больше FEED_FANOUT_LIMIT остаются неразосланными.
+    Возвращает число разосланных рецептов.
+    """
+    limit = settings.FEED_FANOUT_LIMIT
+    total = 0
+    author_ids = list(Recipe.objects.filter(in_timelines=False).order_by(
+        'author_id').values_list('author_id', flat=True).distinct())
+    for author_id in author_ids:
+        followers = Follow.objects.filter(author_id=author_id)
+        if followers[:limit + 1].count() > limit:
+            continue
+        with transaction.atomic():
+            _lock_authors([author_id])
+            recipes = list(Recipe.objects.filter(
+                author_id=author_id, in_timelines=False
+            ).values_list('id', 'pub_date'))
+            user_ids = list(followers.values_list('user_id', flat=True))
+            _bulk_insert(
+                TimelineEntry(user_id=user_id, recipe_id=recipe_id,
+                              author_id=author_id, pub_date=pub_date)
+                for recipe_id, pub_date in recipes for user_id in user_ids
+            )
+            for start in range(0, len(recipes), BATCH_SIZE):
+                Recipe.objects.filter(pk__in=[
+                    recipe_id for recipe_id, _ in
+                    recipes[start:start + BATCH_SIZE]
+                ]).update(in_timelines=True)
+        total += len(recipes)
+    return total
+
+
+def _keys(queryset, id_field, limit, position, reverse):
+    """
+    До limit + 1 пар (pub_date, id) после позиции в порядке ленты, при
+    reverse - перед ней в обратном порядке.
+    """
+    if position is not None:
+        pub_date, recipe_id = position
+        lookup = 'gt' if reverse else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'pub_date__{lookup}': pub_date})
+            | Q(pub_date=pub_date, **{f'{id_field}__{lookup}': recipe_id}))
+    order = (('pub_date', id_field) if reverse
+             else ('-pub_date', f'-{id_field}'))
+    return list(queryset.order_by(*order).values_list(
+        'pub_date', id_field)[:limit + 1])
+
+
+def feed_page(user, limit, position=None, reverse=False):
+    """
+    Страница ленты от новых рецептов к старым после позиции
+    (pub_date, id), при reverse - перед ней. Записи ленты читаются по
+    индексу (user, -pub_date), неразосланные рецепты авторов с большим
+    числом подписчиков - отдельным запросом по частичному индексу;
+    оба запроса ограничены размером страницы. Возвращает рецепты
+    страницы и признак того, что в этом направлении есть еще рецепты.
+    """
+    entries = _keys(TimelineEntry.objects.filter(user=user), 'recipe_id',
+                    limit, position, reverse)
+    pulled = _keys(Recipe.objects.filter(
+        in_timelines=False,
+        author_id__in=Follow.objects.filter(user=user).values('author_id')
+    ), 'id', limit, position, reverse)
+    keys = sorted(set(entries) | set(pulled), reverse=not reverse)
+    ids = [recipe_id for _, recipe_id in keys[:limit]]
+    if reverse:
+        ids.reverse()
+    recipes = Recipe.objects.in_bulk(ids)
+    return ([recipes[recipe_id] for recipe_id in ids if recipe_id in recipes],
+            len(keys) > limit)
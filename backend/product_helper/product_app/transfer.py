@@ -0,0 +1,234 @@
+import json
+from collections import Counter, defaultdict
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import Case, Value, When
+from django.utils.dateparse import parse_datetime
+from jobs.queue import enqueue
+
+from . import generations
+from .models import Ingredient, IngredientAmount, Recipe, Tag, User
+
+BATCH_SIZE = 500
+LOOKUP_SIZE = 500
+
+
+def _dump(record):
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _chunks(items, size=LOOKUP_SIZE):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_lines(chunk_size=BATCH_SIZE):
+    """
+    Рецепты построчно в NDJSON: сначала теги, затем рецепты по id.
+    Рецепты читаются итератором, связи - одним запросом на пачку,
+    поэтому память не зависит от числа рецептов. Автор передается
+    именем пользователя, ингредиенты - названием и единицей
+    измерения, картинка - путем в хранилище файлов.
+    """
+    for tag in Tag.objects.order_by('id').values('name', 'color', 'slug'):
+        yield _dump({'type': 'tag', **tag})
+    slugs = dict(Tag.objects.values_list('id', 'slug'))
+    recipes = Recipe.objects.order_by('id').values_list(
+        'id', 'author__username', 'name', 'text', 'cooking_time',
+        'pub_date', 'image').iterator(chunk_size=chunk_size)
+    for batch in _chunks(recipes, chunk_size):
+        ids = [row[0] for row in batch]
+        tags = defaultdict(list)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids).order_by('tag_id').values_list(
+                'recipe_id', 'tag_id'):
+            tags[recipe_id].append(slugs[tag_id])
+        ingredients = defaultdict(list)
+        for recipe_id, *line in Recipe.ingredients.through.objects.filter(
+                recipe_id__in=ids).order_by(
+                'ingredientamount_id').values_list(
+                'recipe_id', 'ingredientamount__ingredient__name',
+                'ingredientamount__ingredient__measurement_unit',
+                'ingredientamount__amount'):
+            ingredients[recipe_id].append(dict(zip(
+                ('name', 'measurement_unit', 'amount'), line)))
+        for (recipe_id, author, name, text, cooking_time, pub_date,
+                image) in batch:
+            yield _dump({
+                'type': 'recipe',
+                'id': recipe_id,
+                'author': author,
+                'name': name,
+                'text': text,
+                'cooking_time': cooking_time,
+                'pub_date': pub_date.isoformat(),
+                'image': image,
+                'tags': tags[recipe_id],
+                'ingredients': ingredients[recipe_id],
+            })
+
+
+def _import_tags(records):
+    existing = set(Tag.objects.values_list('slug', flat=True))
+    created = 0
+    for record in records:
+        if record['slug'] not in existing:
+            Tag.objects.create(name=record['name'], color=record['color'],
+                               slug=record['slug'])
+            existing.add(record['slug'])
+            created += 1
+    return created
+
+
+def _ingredient_ids(keys):
+    """Id ингредиентов по (названию, единице); недостающие создаются."""
+    def lookup(names):
+        found = {}
+        for chunk in _chunks(names):
+            found.update({
+                (name, unit): ingredient_id
+                for ingredient_id, name, unit in Ingredient.objects.filter(
+                    name__in=chunk).values_list(
+                    'id', 'name', 'measurement_unit')
+            })
+        return found
+
+    found = lookup({name for name, _ in keys})
+    missing = [key for key in keys if key not in found]
+    if missing:
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in missing])
+        found.update(lookup({name for name, _ in missing}))
+        transaction.on_commit(
+            lambda: generations.bump(generations.REFERENCE))
+    return found
+
+
+def _amount_ids(lines):
+    """Id записей количества по (ингредиенту, количеству)."""
+    def lookup(ingredient_ids):
+        found = {}
+        for chunk in _chunks(ingredient_ids):
+            found.update({
+                (ingredient_id, amount): amount_id
+                for amount_id, ingredient_id, amount in
+                IngredientAmount.objects.filter(
+                    ingredient_id__in=chunk).values_list(
+                    'id', 'ingredient_id', 'amount')
+            })
+        return found
+
+    found = lookup({ingredient_id for ingredient_id, _ in lines})
+    missing = [line for line in lines if line not in found]
+    if missing:
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in missing])
+        found.update(lookup({ingredient_id for ingredient_id, _ in missing}))
+    return found
+
+
+def _create_recipes(recipes):
+    """
+    Вставка рецептов с получением id. Если БД не возвращает id
+    массовой вставки (SQLite), рецепты сохраняются по одному.
+    """
+    using = router.db_for_write(Recipe)
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        return Recipe.objects.bulk_create(recipes)
+    for recipe in recipes:
+        recipe.save()
+    return recipes
+
+
+def _import_batch(records, tag_ids, stats):
+    authors = {}
+    for chunk in _chunks({record['author'] for record in records}):
+        authors.update(User.objects.filter(
+            username__in=chunk).values_list('username', 'id'))
+    known = [record for record in records if record['author'] in authors]
+    stats['skipped'] += len(records) - len(known)
+    if not known:
+        return
+    ingredients = _ingredient_ids(dict.fromkeys(
+        (line['name'], line['measurement_unit'])
+        for record in known for line in record['ingredients']))
+    amounts = _amount_ids(dict.fromkeys(
+        (ingredients[line['name'], line['measurement_unit']],
+         int(line['amount']))
+        for record in known for line in record['ingredients']))
+
+    recipes = _create_recipes([Recipe(
+        author_id=authors[record['author']], name=record['name'],
+        text=record['text'], cooking_time=record['cooking_time'],
+        image=record['image'],
+    ) for record in known])
+    # auto_now_add перезаписывает дату при вставке; события create
+    # уже записаны, поэтому дата восстанавливается без событий.
+    models.QuerySet.update(
+        Recipe.objects.filter(id__in=[recipe.id for recipe in recipes]),
+        pub_date=Case(*(
+            When(id=recipe.id, then=Value(parse_datetime(record['pub_date'])))
+            for recipe, record in zip(recipes, known))))
+
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_ids[slug])
+        for recipe, record in zip(recipes, known)
+        for slug in dict.fromkeys(record['tags']) if slug in tag_ids
+    ], ignore_conflicts=True)
+    Recipe.ingredients.through.objects.bulk_create([
+        Recipe.ingredients.through(
+            recipe_id=recipe.id, ingredientamount_id=amount_id)
+        for recipe, record in zip(recipes, known)
+        for amount_id in dict.fromkeys(
+            amounts[ingredients[line['name'], line['measurement_unit']],
+                    int(line['amount'])]
+            for line in record['ingredients'])
+    ], ignore_conflicts=True)
+    stats['recipes'] += len(recipes)
+
+
+def _records(lines):
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def import_lines(lines, batch_size=BATCH_SIZE, progress=None):
+    """
+    Загрузка рецептов из строк NDJSON пачками по batch_size, каждая -
+    в своей транзакции. Теги идут в начале файла. Автор ищется по
+    имени пользователя, теги - по slug, ингредиенты - по названию и
+    единице; недостающие теги и ингредиенты создаются, рецепты
+    неизвестных авторов пропускаются. Рецепты получают новые id.
+    Возвращает счетчики.
+    """
+    stats = Counter()
+    records = _records(lines)
+    tags = []
+    for record in records:
+        if record.get('type') != 'tag':
+            records = chain([record], records)
+            break
+        tags.append(record)
+    with transaction.atomic():
+        stats['tags'] = _import_tags(tags)
+    tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+
+    recipes = (record for record in records if record.get('type') == 'recipe')
+    for batch in _chunks(recipes, batch_size):
+        with transaction.atomic():
+            _import_batch(batch, tag_ids, stats)
+        if progress:
+            progress(stats)
+    if stats['recipes']:
+        enqueue('similarity.refresh', key='similarity.refresh',
+                delay=settings.SIMILAR_RECIPES_REFRESH_DELAY)
+    return stats
@@ -0,0 +1,106 @@
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from .models import Ingredient
+
+# Единица измерения -> (базовая единица, множитель).
+CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+}
+
+# Базовая единица -> (крупная единица, делитель) для вывода.
+DISPLAY_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+
+UNIT_ALIASES = {
+    'гр': 'г',
+    'гр.': 'г',
+    'г.': 'г',
+    'грамм': 'г',
+    'кг.': 'кг',
+    'килограмм': 'кг',
+    'мл.': 'мл',
+    'миллилитр': 'мл',
+    'л.': 'л',
+    'литр': 'л',
+    'шт': 'шт.',
+    'штука': 'шт.',
+    'ст.л.': 'ст. л.',
+    'ч.л.': 'ч. л.',
+}
+
+_canonical = {'map': None, 'built': 0.0}
+_canonical_lock = Lock()
+
+
+def normalize_unit(unit):
+    """Единое написание единицы измерения."""
+    unit = ' '.join(unit.split()).lower()
+    return UNIT_ALIASES.get(unit, unit)
+
+
+def to_base(unit):
+    """Базовая единица и множитель перевода в нее."""
+    unit = normalize_unit(unit)
+    return CONVERSIONS.get(unit, (unit, 1))
+
+
+def build_canonical_map(rows):
+    """
+    Карта {ingredient_id: (canonical_id, базовая единица, множитель)}.
+    Ингредиенты с одинаковым названием и базовой единицей сводятся к
+    одному: записанному в базовой единице, иначе с наименьшим id.
+    """
+    groups = {}
+    for pk, name, unit in rows:
+        base, factor = to_base(unit)
+        key = (' '.join(name.split()).lower(), base)
+        groups.setdefault(key, []).append((factor != 1, pk, factor))
+    result = {}
+    for (_, base), members in groups.items():
+        canonical_id = min(members)[1]
+        for _, pk, factor in members:
+            result[pk] = (canonical_id, base, factor)
+    return result
+
+
+def canonical_map():
+    """Карта канонических ингредиентов каталога с кэшированием."""
+    with _canonical_lock:
+        expired = monotonic() - _canonical['built'] > settings.UNITS_MAP_TTL
+        if _canonical['map'] is None or expired:
+            _canonical['map'] = build_canonical_map(
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit').iterator())
+            _canonical['built'] = monotonic()
+        return _canonical['map']
+
+
+def clear_canonical_map(**kwargs):
+    """Сброс карты при изменении каталога."""
+    with _canonical_lock:
+        _canonical['map'] = None
+
+
+def canonical(ingredient_id, unit):
+    """Канонический ингредиент, базовая единица и множитель."""
+    mapped = canonical_map().get(ingredient_id)
+    if mapped is None:
+        return (ingredient_id, *to_base(unit))
+    return mapped
+
+
+def humanize(amount, unit):
+    """Количество в удобной для чтения единице."""
+    larger, divisor = DISPLAY_UNITS.get(unit, (None, 1))
+    if larger is None or amount < divisor:
+        return amount, unit
+    value = f'{amount / divisor:.3f}'.rstrip('0').rstrip('.')
+    return value, larger
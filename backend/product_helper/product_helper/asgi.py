@@ -0,0 +1,10 @@
+import os
+
+import django
+from product_helper.handlers import StreamingASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'product_helper.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
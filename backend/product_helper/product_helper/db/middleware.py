@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from .routers import use_replica
+
+PIN_COOKIE = 'db_primary_pin'
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Разрешает чтение с реплик для безопасных запросов.
+    После успешной записи клиент на DB_REPLICA_PIN_SECONDS закрепляется
+    за основной БД, чтобы не видеть отстающие данные реплики.
+    """
+
+    def process_request(self, request):
+        use_replica.set(
+            request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+        )
+
+    def process_response(self, request, response):
+        use_replica.set(False)
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.DB_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
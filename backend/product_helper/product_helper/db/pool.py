@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведенное время."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений с БД внутри процесса.
+    Ограничивает число открытых соединений, закрывает простаивающие
+    дольше idle_timeout, проверяет свободные соединения при выдаче и
+    собирает статистику ожидания.
+    """
+
+    def __init__(self, connect, max_size=10, idle_timeout=300,
+                 wait_timeout=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+        self.created = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+
+    def _close_expired(self):
+        """Закрытие соединений, простаивающих дольше idle_timeout."""
+        deadline = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < deadline:
+            self._idle.popleft()[0].close()
+            self._size -= 1
+
+    def _reserve(self):
+        """
+        Резервирование места в пуле под блокировкой.
+        Возвращает свободное соединение или None, если нужно открыть новое.
+        """
+        started = None
+        while True:
+            if self._idle:
+                connection = self._idle.pop()[0]
+                break
+            if self._size < self.max_size:
+                self._size += 1
+                connection = None
+                break
+            now = time.monotonic()
+            if started is None:
+                started = now
+                self.waits += 1
+            remaining = self.wait_timeout - (now - started)
+            if remaining <= 0:
+                self.timeouts += 1
+                raise PoolTimeoutError(
+                    f'Пул соединений исчерпан ({self.max_size}).')
+            self._condition.wait(remaining)
+        if started is not None:
+            waited = time.monotonic() - started
+            self.wait_time += waited
+            logger.debug('Ожидание соединения из пула: %.3f с', waited)
+        return connection
+
+    @staticmethod
+    def is_alive(connection):
+        """
+        Проверка свободного соединения запросом SELECT 1: после
+        перезапуска PostgreSQL или pgbouncer сокет закрыт сервером.
+        """
+        from psycopg2 import Error, extensions
+
+        if connection.closed:
+            return False
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if (connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Error:
+            return False
+        return True
+
+    def _discard(self, connection):
+        """Закрытие неработающего соединения и освобождение места."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self.discarded += 1
+            self._condition.notify()
+        logger.info('Соединение из пула не отвечает и закрыто')
+
+    def acquire(self):
+        """
+        Получение соединения: свободного и отвечающего, нового или
+        после ожидания. Неработающие свободные соединения закрываются.
+        """
+        while True:
+            with self._condition:
+                self._close_expired()
+                connection = self._reserve()
+            if connection is None:
+                break
+            if self.is_alive(connection):
+                return connection
+            self._discard(connection)
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self.created += 1
+        return connection
+
+    def release(self, connection):
+        """Возврат соединения в пул с откатом незавершенной транзакции."""
+        from psycopg2 import extensions
+
+        status = (connection.get_transaction_status()
+                  if not connection.closed
+                  else extensions.TRANSACTION_STATUS_UNKNOWN)
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            connection.close()
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            return
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_idle(self):
+        """Закрытие всех свободных соединений, например перед fork."""
+        with self._condition:
+            while self._idle:
+                self._idle.popleft()[0].close()
+                self._size -= 1
+
+    def stats(self):
+        """Метрики пула для мониторинга."""
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'created': self.created,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 3),
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+            }
+
+
+def close_unusable_connections(**kwargs):
+    """Закрытие переиспользуемых соединений, которые перестали отвечать."""
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,62 @@
+import functools
+import os
+import threading
+
+from django.db.backends.postgresql import base
+
+from ..pool import ConnectionPool, PoolTimeoutError
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL, получающий соединения из пула процесса."""
+
+    def get_pool(self, conn_params):
+        """Пул для текущего процесса, создается при первом обращении."""
+        key = (os.getpid(), self.alias)
+        with _pools_lock:
+            if key not in _pools:
+                options = self.settings_dict.get('POOL', {})
+                _pools[key] = ConnectionPool(
+                    functools.partial(
+                        base.DatabaseWrapper.get_new_connection,
+                        self, conn_params
+                    ),
+                    max_size=options.get('MAX_SIZE', 10),
+                    idle_timeout=options.get('IDLE_TIMEOUT', 300),
+                    wait_timeout=options.get('WAIT_TIMEOUT', 30),
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.acquire()
+        except PoolTimeoutError as error:
+            raise base.Database.OperationalError(str(error)) from error
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
+
+
+def pool_stats():
+    """Метрики пулов текущего процесса по псевдонимам БД."""
+    return {
+        alias: pool.stats()
+        for (pid, alias), pool in _pools.items()
+        if pid == os.getpid()
+    }
+
+
+def close_idle_connections():
+    """Закрытие свободных соединений пулов текущего процесса."""
+    for (pid, alias), pool in list(_pools.items()):
+        if pid == os.getpid():
+            pool.close_idle()
@@ -0,0 +1,49 @@
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+use_replica = contextvars.ContextVar('use_replica', default=False)
+
+_unavailable_until = {}
+
+
+def is_available(alias):
+    """Доступна ли реплика. Недоступная пропускается на время паузы."""
+    if _unavailable_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError as error:
+        logger.warning('Реплика %s недоступна: %s', alias, error)
+        _unavailable_until[alias] = (
+            time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS)
+        return False
+    return True
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение в безопасных запросах идет на реплики, остальное — в default.
+    Если ни одна реплика не доступна, чтение идет в основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not use_replica.get():
+            return 'default'
+        replicas = [
+            alias for alias in settings.DATABASE_REPLICAS
+            if is_available(alias)
+        ]
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
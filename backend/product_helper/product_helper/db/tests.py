@@ -0,0 +1,162 @@
+import time
+import unittest
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from psycopg2 import OperationalError, extensions
+
+from .middleware import PIN_COOKIE
+from .pool import ConnectionPool
+from .routers import PrimaryReplicaRouter, use_replica
+
+POOLED = connection.settings_dict['ENGINE'] == 'product_helper.db.postgresql'
+
+
+class FakeCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise OperationalError('server closed the connection')
+
+
+class FakeConnection:
+    closed = 0
+    broken = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def test_idle_connection_is_reused(self):
+        pool = ConnectionPool(FakeConnection)
+        first = pool.acquire()
+        pool.release(first)
+        for _ in range(3):
+            pool.release(pool.acquire())
+        self.assertEqual(pool.created, 1)
+        self.assertIs(pool.acquire(), first)
+
+    def test_dead_connection_is_discarded_on_checkout(self):
+        pool = ConnectionPool(FakeConnection, max_size=1)
+        dead = pool.acquire()
+        pool.release(dead)
+        dead.broken = True
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+
+@unittest.skipUnless(POOLED, 'нужен PostgreSQL с DB_POOL=True')
+class PostgresPoolTests(TransactionTestCase):
+
+    def test_requests_do_not_open_connections(self):
+        from .postgresql.base import pool_stats
+
+        self.client.get('/api/tags/')
+        created = pool_stats()[connection.alias]['created']
+        for _ in range(10):
+            self.assertEqual(self.client.get('/api/tags/').status_code, 200)
+        self.assertEqual(pool_stats()[connection.alias]['created'], created)
+
+    def test_connection_killed_by_server_is_replaced(self):
+        import psycopg2
+
+        pool = ConnectionPool(lambda: psycopg2.connect(
+            **connection.get_connection_params()))
+        pooled = pool.acquire()
+        pooled.autocommit = True
+        backend_pid = pooled.get_backend_pid()
+        pool.release(pooled)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [backend_pid])
+            for _ in range(50):
+                cursor.execute('SELECT count(*) FROM pg_stat_activity '
+                               'WHERE pid = %s', [backend_pid])
+                if not cursor.fetchone()[0]:
+                    break
+                time.sleep(0.1)
+
+        fresh = pool.acquire()
+        with fresh.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertNotEqual(fresh.get_backend_pid(), backend_pid)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        fresh.close()
+
+
+@unittest.skipUnless(settings.DATABASE_REPLICAS,
+                     'нужна реплика: DB_REPLICAS=replica.sqlite3')
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.replica = settings.DATABASE_REPLICAS[0]
+
+    def queries(self, method, path, **kwargs):
+        """Ответ и число запросов к основной БД и к реплике."""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[self.replica]) as replica:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        token = use_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(None), self.replica)
+            self.assertEqual(router.db_for_write(None), 'default')
+        finally:
+            use_replica.reset(token)
+        self.assertEqual(router.db_for_read(None), 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        response, primary, replica = self.queries('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_read_after_write_goes_to_primary(self):
+        response, primary, replica = self.queries('post', '/api/users/', data={
+            'email': 'cook@example.com', 'username': 'cook',
+            'first_name': 'Иван', 'last_name': 'Иванов',
+            'password': 'Vegetable-Soup-42',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response, primary, replica = self.queries('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        self.client.cookies.pop(PIN_COOKIE)
+        _, primary, replica = self.queries('get', '/api/recipes/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+
+
+def response_headers(response):
+    """Заголовки и cookie ответа в виде ASGI, как у ASGIHandler."""
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+def close_stream(response):
+    """Закрытие ответа и соединений с БД потока, который его читал."""
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Потоковые ответы читаются в отдельном потоке и отправляются по
+    частям по мере готовности. ASGIHandler Django 3.2 перебирает их
+    прямо в цикле событий, а генераторы ответов читают БД пачками.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='asgi-stream')
+        parts = iter(response)
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': response_headers(response),
+            })
+            while True:
+                part = await loop.run_in_executor(reader, next, parts, None)
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await loop.run_in_executor(reader, close_stream, response)
+            reader.shutdown(wait=False)
+            await sync_to_async(
+                close_old_connections, thread_sensitive=True)()
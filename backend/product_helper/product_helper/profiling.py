@@ -0,0 +1,184 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_X_PROFILE'
+
+Query = namedtuple('Query', ('alias', 'sql', 'params', 'many', 'duration'))
+
+# cProfile в одном процессе одновременно профилирует только один запрос.
+_profiler_lock = threading.Lock()
+
+
+class QueryCapture:
+    """Обертка выполнения SQL: запоминает запросы и их время."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(Query(
+                context['connection'].alias, sql, params, many,
+                time.perf_counter() - started))
+
+
+def is_superuser(request):
+    """Суперпользователь по сессии или по токену API."""
+    if request.user.is_superuser:
+        return True
+    for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication().authenticate(request)
+        except APIException:
+            return False
+        if result is not None:
+            return result[0].is_superuser
+    return False
+
+
+def explain(query):
+    """План запроса; на PostgreSQL - с фактическим временем выполнения."""
+    connection = connections[query.alias]
+    options = {'analyze': True, 'buffers': True} if (
+        connection.vendor == 'postgresql') else {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix(**options)} '
+                f'{query.sql}', query.params)
+            return '\n'.join(' '.join(map(str, row))
+                             for row in cursor.fetchall())
+    except DatabaseError as error:
+        return f'EXPLAIN не выполнен: {error}'
+
+
+def report(request, response, elapsed, profiler, queries):
+    """Текстовый отчет: SQL, планы самых долгих запросов и pstats."""
+    out = io.StringIO()
+    sql_time = sum(query.duration for query in queries)
+    out.write(f'{request.method} {request.get_full_path()} '
+              f'{response.status_code}\n')
+    out.write(f'Время: {elapsed * 1000:.1f} мс, SQL: {len(queries)} '
+              f'запросов, {sql_time * 1000:.1f} мс\n')
+
+    slowest = sorted(queries, key=lambda query: query.duration,
+                     reverse=True)
+    out.write('\n== SQL по убыванию времени ==\n')
+    for query in slowest:
+        out.write(f'{query.duration * 1000:9.2f} мс  {query.alias}  '
+                  f'{query.sql}  {query.params!r}\n')
+
+    repeated = [(sql, count) for sql, count in Counter(
+        query.sql for query in queries).most_common() if count > 1]
+    if repeated:
+        out.write('\n== Повторяющиеся запросы ==\n')
+        for sql, count in repeated:
+            out.write(f'{count:6d} x  {sql}\n')
+
+    selects = [query for query in slowest if not query.many
+               and query.sql.lstrip().upper().startswith('SELECT')]
+    for query in selects[:settings.PROFILING_EXPLAIN_LIMIT]:
+        out.write(f'\n== EXPLAIN ({query.duration * 1000:.2f} мс) ==\n'
+                  f'{query.sql}\n{explain(query)}\n')
+
+    out.write('\n== cProfile ==\n')
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(
+        settings.PROFILING_TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запроса с заголовком X-Profile: значение
+    PROFILING_SECRET или любое значение от суперпользователя.
+    Вместо ответа возвращается отчет-вложение, исходный статус - в
+    заголовке X-Profile-Status. Запросы без заголовка не затрагиваются.
+    Под ASGI остается асинхронным звеном цепочки; профилируемый запрос
+    целиком выполняется в одном потоке.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как у MiddlewareMixin: обработчик Django ждет корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if HEADER not in request.META:
+            return self.get_response(request)
+        if not self.allowed(request) or not _profiler_lock.acquire(False):
+            return self.get_response(request)
+        try:
+            return self.profile(request, self.get_response)
+        finally:
+            _profiler_lock.release()
+
+    async def __acall__(self, request):
+        if HEADER not in request.META:
+            return await self.get_response(request)
+        allowed = await sync_to_async(self.allowed)(request)
+        if not allowed or not _profiler_lock.acquire(False):
+            return await self.get_response(request)
+        try:
+            return await sync_to_async(self.profile)(
+                request, async_to_sync(self.get_response))
+        finally:
+            _profiler_lock.release()
+
+    def allowed(self, request):
+        secret = settings.PROFILING_SECRET
+        if secret and constant_time_compare(request.META[HEADER], secret):
+            return True
+        return is_superuser(request)
+
+    def profile(self, request, get_response):
+        capture = QueryCapture()
+        profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(capture))
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+        profile = HttpResponse(
+            report(request, response, elapsed, profiler, capture.queries),
+            content_type='text/plain; charset=utf-8')
+        profile['Content-Disposition'] = (
+            'attachment; filename="profile-'
+            f'{timezone.now():%Y%m%d-%H%M%S}.txt"')
+        profile['X-Profile-Status'] = response.status_code
+        profile['Cache-Control'] = 'no-store'
+        response.close()
+        logger.info('Профиль запроса %s %s, %.1f мс', request.method,
+                    request.path, elapsed * 1000)
+        return profile
@@ -28,6 +28,8 @@ INSTALLED_APPS = [
     'django_filters',
     'product_app',
     'api',
+    'jobs',
+    'outbox',
 ]
 
 MIDDLEWARE = [
@@ -36,6 +38,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'product_helper.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,6 +62,15 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'product_helper.wsgi.application'
+ASGI_APPLICATION = 'product_helper.asgi.application'
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASYNC_THREAD_POOL_SIZE = int(os.getenv('ASYNC_THREAD_POOL_SIZE', 8))
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'False') == 'True'
+
+PROFILING_SECRET = os.getenv('PROFILING_SECRET', '')
+PROFILING_EXPLAIN_LIMIT = int(os.getenv('PROFILING_EXPLAIN_LIMIT', 5))
+PROFILING_TOP_FUNCTIONS = int(os.getenv('PROFILING_TOP_FUNCTIONS', 60))
 
 DATABASES = {
     'default': {
@@ -67,10 +79,87 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+if os.getenv('DB_POOL', 'False') == 'True':
+    DATABASES['default'].update({
+        'ENGINE': 'product_helper.db.postgresql',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'IDLE_TIMEOUT': int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+            'WAIT_TIMEOUT': int(os.getenv('DB_POOL_WAIT_TIMEOUT', 30)),
+        },
+    })
+
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if DATABASES[alias]['ENGINE'].endswith('sqlite3'):
+        DATABASES[alias]['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        DATABASES[alias]['HOST'] = host
+        DATABASES[alias]['PORT'] = port or DATABASES['default']['PORT']
+    DATABASE_REPLICAS.append(alias)
+
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS', 30))
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['product_helper.db.routers.PrimaryReplicaRouter']
+    MIDDLEWARE.append('product_helper.db.middleware.ReplicaRoutingMiddleware')
+
+# Кэши, общие для всех процессов: memcached из docker-compose.
+SHARED_CACHE_BACKEND = os.getenv(
+    'SHARED_CACHE_BACKEND',
+    'django.core.cache.backends.memcached.PyMemcacheCache')
+SHARED_CACHE_LOCATION = os.getenv('SHARED_CACHE_LOCATION', 'memcached:11211')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': os.getenv('FRAGMENT_CACHE_BACKEND', SHARED_CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'FRAGMENT_CACHE_LOCATION', SHARED_CACHE_LOCATION),
+        'TIMEOUT': int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 300)),
+    },
+    'throttle': {
+        'BACKEND': os.getenv('THROTTLE_CACHE_BACKEND', SHARED_CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'THROTTLE_CACHE_LOCATION', SHARED_CACHE_LOCATION),
+    },
+    'generations': {
+        'BACKEND': os.getenv(
+            'GENERATION_CACHE_BACKEND', SHARED_CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'GENERATION_CACHE_LOCATION', SHARED_CACHE_LOCATION),
+    },
+}
+
+if CACHES['fragments']['BACKEND'].endswith('LocMemCache'):
+    CACHES['fragments']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 10000)),
+    }
+
+RECIPE_FRAGMENT_CACHE = 'fragments'
+FRAGMENT_CACHE_HOLD = int(
+    os.getenv('FRAGMENT_CACHE_HOLD', DB_REPLICA_PIN_SECONDS))
+THROTTLE_CACHE = 'throttle'
+GENERATION_CACHE = 'generations'
+# Копии справочников процесса перечитываются не реже, даже если
+# сигнал о новом поколении потерялся.
+GENERATION_TTL = int(os.getenv('GENERATION_TTL', 300))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,6 +194,10 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
@@ -112,13 +205,16 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'api.throttling.AnonCacheRateThrottle',
+        'api.throttling.ScopedCacheRateThrottle',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_THROTTLE_RATES': {
-        'user': '500/minute',
         'anon': '100/minute',
+        'read': '1000/minute',
+        'write': '500/minute',
+        'login': '10/minute',
+        'recipes_create': '30/minute',
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
@@ -141,3 +237,36 @@ INGRIDIENT_NAME_LENGTH = 200
 RECIPE_NAME_LENGTH = 200
 MEASURMENT_COUNT_LENGTH = 200
 RECIPE_DESC_LENGTH = 20000
+BATCH_MAX_SIZE = 100
+UNITS_MAP_TTL = int(os.getenv('UNITS_MAP_TTL', 300))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+VIEWS_FLUSH_INTERVAL = int(os.getenv('VIEWS_FLUSH_INTERVAL', 10))
+TRENDING_HALF_LIFE = int(os.getenv('TRENDING_HALF_LIFE', 24))
+SIMILAR_RECIPES_TOP_K = int(os.getenv('SIMILAR_RECIPES_TOP_K', 10))
+SIMILAR_RECIPES_BATCH_SIZE = int(
+    os.getenv('SIMILAR_RECIPES_BATCH_SIZE', 256))
+SIMILAR_RECIPES_REFRESH_DELAY = int(
+    os.getenv('SIMILAR_RECIPES_REFRESH_DELAY', 300))
+RECOMMENDATIONS_TOP_N = int(os.getenv('RECOMMENDATIONS_TOP_N', 20))
+RECOMMENDATIONS_BATCH_SIZE = int(
+    os.getenv('RECOMMENDATIONS_BATCH_SIZE', 256))
+RECOMMENDATIONS_CACHE_TIMEOUT = int(
+    os.getenv('RECOMMENDATIONS_CACHE_TIMEOUT', 300))
+RECOMMENDATIONS_REFRESH_DELAY = int(
+    os.getenv('RECOMMENDATIONS_REFRESH_DELAY', 300))
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False') == 'True'
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_RETRY_MAX_DELAY = int(os.getenv('JOBS_RETRY_MAX_DELAY', 3600))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', 1800))
+JOBS_BATCH_SIZE = int(os.getenv('JOBS_BATCH_SIZE', 10))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_KEEP_DONE_DAYS = int(os.getenv('JOBS_KEEP_DONE_DAYS', 7))
+
+OUTBOX_SETTLE_DELAY = int(os.getenv('OUTBOX_SETTLE_DELAY', 5))
+OUTBOX_GAP_TIMEOUT = int(os.getenv('OUTBOX_GAP_TIMEOUT', 3600))
+OUTBOX_MAX_GAPS = int(os.getenv('OUTBOX_MAX_GAPS', 1000))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 500))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_KEEP_DAYS = int(os.getenv('OUTBOX_KEEP_DAYS', 7))
@@ -0,0 +1,118 @@
+import inspect
+import logging
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import close_caches
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+HEAVY_MODULES = (
+    'PIL.Image',
+    'djoser.views',
+    'drf_extra_fields.fields',
+    'rest_framework_simplejwt.authentication',
+    'rest_framework.renderers',
+    'rest_framework.templatetags.rest_framework',
+)
+
+
+def import_modules():
+    """Модули, которые иначе грузятся на первых запросах."""
+    for name in HEAVY_MODULES:
+        import_module(name)
+    from PIL import Image
+
+    Image.init()
+
+
+def _compile(resolver):
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile(pattern)
+
+
+def build_urls():
+    """Компиляция регулярных выражений и обратных словарей URL."""
+    resolver = get_resolver()
+    _compile(resolver)
+    for namespace in resolver.namespace_dict:
+        resolver.namespace_dict[namespace][1].reverse_dict
+
+
+def build_serializers():
+    """Построение полей всех сериализаторов API."""
+    from rest_framework import serializers
+
+    module = import_module('api.serializers')
+    for _, serializer in inspect.getmembers(module, inspect.isclass):
+        if (issubclass(serializer, serializers.Serializer)
+                and serializer.__module__ == module.__name__):
+            serializer().fields
+
+
+def build_templates():
+    """Шаблоны браузируемого API."""
+    get_template('rest_framework/api.html')
+
+
+def fill_caches():
+    """Кэши процесса: единицы ингредиентов, теги и справочник."""
+    from api.reference import get_snapshot
+    from product_app.tags import registry
+    from product_app.units import canonical_map
+
+    canonical_map()
+    registry()
+    get_snapshot()
+
+
+STEPS = (
+    ('modules', import_modules),
+    ('urls', build_urls),
+    ('serializers', build_serializers),
+    ('templates', build_templates),
+    ('caches', fill_caches),
+)
+
+
+def close_connections():
+    """
+    Закрытие соединений с БД и кэшами после прогрева, чтобы процессы,
+    порожденные fork, не делили сокеты.
+    """
+    connections.close_all()
+    close_caches()
+    if any(database['ENGINE'] == 'product_helper.db.postgresql'
+           for database in settings.DATABASES.values()):
+        from product_helper.db.postgresql.base import close_idle_connections
+
+        close_idle_connections()
+
+
+def warmup():
+    """
+    Прогрев процесса до первого запроса. Ошибка шага (например,
+    непримененные миграции) не мешает запуску. Возвращает время
+    шагов в секундах.
+    """
+    timings = {}
+    try:
+        for name, step in STEPS:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.warning('Шаг прогрева %s не выполнен', name,
+                               exc_info=True)
+            timings[name] = time.perf_counter() - started
+    finally:
+        close_connections()
+    logger.info('Прогрев завершен: %s', ', '.join(
+        f'{name} {seconds:.3f} с' for name, seconds in timings.items()))
+    return timings
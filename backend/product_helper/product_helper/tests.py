@@ -0,0 +1,96 @@
+import asyncio
+import time
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from product_app.models import Ingredient, ShoppingListItem, User
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import startup
+from .handlers import StreamingASGIHandler
+from .profiling import ProfilingMiddleware
+
+SECRET = 'profile-secret'
+
+
+@override_settings(PROFILING_SECRET=SECRET)
+class ProfilingMiddlewareTests(TestCase):
+
+    def assert_profile(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Profile-Status'], '200')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn(b'== cProfile ==', response.content)
+
+    def test_sync_request_is_profiled(self):
+        self.assert_profile(
+            self.client.get('/api/tags/', HTTP_X_PROFILE=SECRET))
+
+    async def test_async_request_is_profiled(self):
+        # AsyncClient Django 3.2 принимает заголовки по их HTTP-именам.
+        self.assert_profile(await self.async_client.get(
+            '/api/tags/', **{'X-Profile': SECRET}))
+
+    async def test_async_requests_run_concurrently(self):
+        async def get_response(request):
+            await asyncio.sleep(0.2)
+            return HttpResponse()
+
+        middleware = ProfilingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            middleware(RequestFactory().get('/api/tags/'))
+            for _ in range(4)))
+        self.assertLess(time.perf_counter() - started, 0.6)
+
+
+class WarmupTests(SimpleTestCase):
+
+    def test_cache_connections_are_closed_before_fork(self):
+        with mock.patch.object(type(caches['generations']), 'close') as close:
+            startup.close_connections()
+        close.assert_called()
+
+
+class StreamingASGIHandlerTests(TransactionTestCase):
+
+    async def request(self, path, headers):
+        communicator = ApplicationCommunicator(StreamingASGIHandler(), {
+            'type': 'http', 'method': 'GET', 'path': path,
+            'query_string': b'', 'headers': headers,
+        })
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(timeout=5)
+        body = []
+        while True:
+            message = await communicator.receive_output(timeout=5)
+            if not message.get('more_body'):
+                break
+            body.append(message['body'])
+        return start['status'], body
+
+    async def test_streaming_response_reads_database_off_the_loop(self):
+        user = await sync_to_async(self.create_list)()
+        token = str(RefreshToken.for_user(user).access_token)
+        status, body = await self.request(
+            '/api/recipes/download_shopping_cart/',
+            [(b'authorization', f'Token {token}'.encode())])
+        self.assertEqual(status, 200)
+        self.assertEqual(b''.join(body).decode().splitlines(), [
+            'мука (г) — 500', 'соль (г) — 5'])
+        self.assertEqual(len(body), 2)
+
+    def create_list(self):
+        user = User.objects.create(username='cook', email='c@x.ru')
+        for name, amount in (('соль', 5), ('мука', 500)):
+            ShoppingListItem.objects.create(
+                user=user, measurement_unit='г', amount=amount,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit='г'))
+        return user